@@ -0,0 +1,653 @@
+"""Entrada ASGI de la API REST: `uvicorn asgi:aplicacion`.
+
+Sirve las rutas /api/* de uso intensivo (login, listado, altas y
+ediciones) con handlers async sobre el engine asyncio de SQLAlchemy
+(asyncpg en PostgreSQL, aiosqlite en local). Las paginas HTML y el resto
+de la API siguen en la app Flask (`app:create_app()`).
+"""
+import asyncio
+import functools
+import json
+import logging
+import os
+import re
+from contextlib import asynccontextmanager
+from urllib.parse import parse_qsl
+
+from sqlalchemy import exists, select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app import (
+    CLAVES_LISTADO,
+    COLUMNAS_LISTADO,
+    MAX_LIMIT_PACIENTES,
+    Paciente,
+    PersonalMedico,
+    Residencia,
+    Usuario,
+    armar_resumen,
+    bus_pacientes,
+    cache_usuarios,
+    censo,
+    consultas_resumen,
+    create_app,
+    crear_token,
+    descartar_eventos,
+    entregar_eventos,
+    etag_de,
+    evento_vinculo,
+    filtrar_pacientes,
+    fragmentos_html,
+    id_usuario_insertado,
+    indice_pacientes,
+    limites_login,
+    password_correcta,
+    rechazo_login,
+    rechazo_registro,
+    reservar_en,
+    sentencia_insertar_usuario,
+    sentencia_verificar_registro,
+    usuario_de_token,
+)
+from compresion import (
+    MINIMO_COMPRESION,
+    comprimir,
+    compresor,
+    elegir_codificacion,
+)
+from eventos import BusPostgres, sentencia_notificar
+from serializacion import SerializadorJSON
+
+DRIVERS_ASYNC = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+LOTE_STREAM = 500
+
+log = logging.getLogger(__name__)
+# Configuracion, cache de usuarios y bus compartidos con la app Flask
+app = create_app()
+serializador = SerializadorJSON()
+filas_json = serializador.filas(CLAVES_LISTADO)
+
+motor = None
+preparando = None
+
+
+def url_async(url):
+    esquema, resto = url.split("://", 1)
+    return DRIVERS_ASYNC.get(esquema.split("+")[0], esquema) + "://" + resto
+
+
+def obtener_motor():
+    global motor
+    if motor is None:
+        url = os.environ.get("ASYNC_DATABASE_URL") or url_async(
+            app.config["SQLALCHEMY_DATABASE_URI"])
+        motor = create_async_engine(
+            url, **app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+    return motor
+
+
+async def preparar_motor():
+    """Abre y cierra una conexion antes de atender requests.
+
+    Con SQLAlchemy 1.4 dos primeras conexiones simultaneas al mismo engine
+    async pueden bloquearse esperando la inicializacion del dialecto; con
+    una conexion previa el dialecto ya queda inicializado.
+    """
+    global preparando
+    actual = obtener_motor()
+    if getattr(actual, "preparado", False):
+        return
+    if preparando is None or preparando[0] is not actual:
+        preparando = (actual, asyncio.Lock())
+    async with preparando[1]:
+        if not getattr(actual, "preparado", False):
+            async with actual.connect():
+                pass
+            actual.preparado = True
+
+
+def a_json(datos):
+    # Mismo formato que jsonify
+    return serializador.dumps(datos)
+
+
+async def comprimir_stream(partes, codificacion):
+    comprimir_parte, terminar = compresor(codificacion)
+    async for parte in partes:
+        datos = comprimir_parte(parte)
+        if datos:
+            yield datos
+    yield terminar()
+
+
+class Peticion:
+    def __init__(self, scope, cuerpo):
+        self.metodo = scope["method"]
+        self.ruta = scope["path"]
+        self.query = scope.get("query_string", b"").decode("latin-1")
+        self.args = dict(parse_qsl(self.query))
+        self.cabeceras = {
+            nombre.decode("latin-1").lower(): valor.decode("latin-1")
+            for nombre, valor in scope.get("headers", [])
+        }
+        self.cuerpo = cuerpo
+        self.ip = (scope.get("client") or ("",))[0]
+
+    @property
+    def ruta_completa(self):
+        # Igual que request.full_path, para que los ETag coincidan
+        return self.ruta + "?" + self.query
+
+    def json(self):
+        return json.loads(self.cuerpo or b"null")
+
+    def entero(self, nombre):
+        try:
+            return int(self.args[nombre])
+        except (KeyError, ValueError):
+            return None
+
+    def no_modificado(self, etag):
+        valor = self.cabeceras.get("if-none-match")
+        if not valor:
+            return False
+        etiquetas = {parte.strip().replace("W/", "", 1).strip('"')
+                     for parte in valor.split(",")}
+        return "*" in etiquetas or etag in etiquetas
+
+
+class Respuesta:
+    def __init__(self, datos=None, estado=200, etag=None, cuerpo=None):
+        self.estado = estado
+        self.cuerpo = cuerpo
+        if cuerpo is None and datos is not None:
+            self.cuerpo = a_json(datos)
+        self.etag = etag
+        self.codificacion = None
+        self.retry_after = None
+
+    def comprimir(self, codificacion):
+        # Igual que compresion.Compresion en la app Flask
+        if self.estado != 200 or self.cuerpo is None or codificacion is None:
+            return
+        if isinstance(self.cuerpo, bytes):
+            if len(self.cuerpo) < MINIMO_COMPRESION:
+                return
+            self.cuerpo = comprimir(self.cuerpo, codificacion)
+        else:
+            self.cuerpo = comprimir_stream(self.cuerpo, codificacion)
+        self.codificacion = codificacion
+
+    def cabeceras(self):
+        cabeceras = []
+        if self.cuerpo is not None:
+            cabeceras.append((b"content-type", b"application/json"))
+            cabeceras.append((b"vary", b"Accept-Encoding"))
+        if self.codificacion:
+            cabeceras.append((b"content-encoding",
+                              self.codificacion.encode("ascii")))
+        if self.retry_after:
+            cabeceras.append((b"retry-after",
+                              str(self.retry_after).encode("ascii")))
+        if self.etag:
+            etag = '"%s"' % self.etag
+            if self.codificacion:
+                etag = "W/" + etag
+            cabeceras.append((b"etag", etag.encode("ascii")))
+        return cabeceras
+
+    async def enviar(self, send):
+        cuerpo = self.cuerpo if self.cuerpo is not None else b""
+        cabeceras = self.cabeceras()
+        if isinstance(cuerpo, bytes):
+            cabeceras.append(
+                (b"content-length", str(len(cuerpo)).encode("ascii")))
+        await send({"type": "http.response.start", "status": self.estado,
+                    "headers": cabeceras})
+        if isinstance(cuerpo, bytes):
+            await send({"type": "http.response.body", "body": cuerpo})
+            return
+        async for parte in cuerpo:
+            await send({"type": "http.response.body", "body": parte,
+                        "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+
+RUTAS = []
+
+
+def ruta(metodo, patron):
+    def registrar(funcion):
+        RUTAS.append((metodo, re.compile("^" + patron + "$"), funcion))
+        return funcion
+    return registrar
+
+
+def autenticado(funcion):
+    # Como login_required pero solo con el token: aca no hay sesiones
+    @functools.wraps(funcion)
+    async def envoltura(peticion, **kwargs):
+        with app.app_context():
+            peticion.usuario = usuario_de_token(
+                peticion.cabeceras.get("authorization", ""))
+        if peticion.usuario is None:
+            return Respuesta({"message": "No autorizado", "error": True}, 401)
+        return await funcion(peticion, **kwargs)
+    return envoltura
+
+
+async def aplicacion(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await ciclo_de_vida(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+    cuerpo = b""
+    while True:
+        mensaje = await receive()
+        cuerpo += mensaje.get("body", b"")
+        if not mensaje.get("more_body"):
+            break
+    peticion = Peticion(scope, cuerpo)
+    respuesta = Respuesta({"message": "No encontrado"}, 404)
+    for metodo, patron, funcion in RUTAS:
+        encontrado = patron.match(peticion.ruta)
+        if encontrado:
+            if metodo != peticion.metodo:
+                respuesta = Respuesta({"message": "Metodo no permitido"}, 405)
+                continue
+            try:
+                await preparar_motor()
+                respuesta = await funcion(peticion, **encontrado.groupdict())
+            except Exception:
+                log.exception("Error en %s %s", peticion.metodo, peticion.ruta)
+                respuesta = Respuesta({"message": "Error en el BE",
+                                       "error": True}, 500)
+            break
+    respuesta.comprimir(elegir_codificacion(
+        peticion.cabeceras.get("accept-encoding")))
+    await respuesta.enviar(send)
+
+
+async def ciclo_de_vida(receive, send):
+    while True:
+        mensaje = await receive()
+        if mensaje["type"] == "lifespan.startup":
+            try:
+                await preparar_motor()
+            except Exception as e:
+                await send({"type": "lifespan.startup.failed",
+                            "message": str(e)})
+                return
+            await send({"type": "lifespan.startup.complete"})
+        elif mensaje["type"] == "lifespan.shutdown":
+            if motor is not None:
+                await motor.dispose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+class Cambios:
+    """Hace de sesion para los hooks after_commit/after_rollback de app.py
+    (entregar_eventos/descartar_eventos): aqui se trabaja con Core sobre la
+    conexion y no hay eventos del ORM, asi que los deltas del censo, las
+    versiones, las reservas y los eventos se anotan a mano en `info`."""
+
+    def __init__(self):
+        self.info = {}
+
+    @asynccontextmanager
+    async def transaccion(self):
+        try:
+            async with obtener_motor().begin() as conexion:
+                yield conexion
+        except BaseException:
+            descartar_eventos(self)
+            raise
+        entregar_eventos(self)
+
+    def delta(self, *delta):
+        self.info.setdefault("censo", []).append(delta)
+
+    async def publicar(self, conexion, evento):
+        if isinstance(bus_pacientes.bus, BusPostgres):
+            await conexion.execute(sentencia_notificar(evento))
+        else:
+            bus_pacientes.publicar(self, None, evento)
+
+    async def subir_versiones(self, conexion, *residencias):
+        # Igual que incrementar_version de app.py
+        ids = {int(id) for id in residencias if id is not None}
+        tabla = Residencia.__table__
+        update = (tabla.update()
+                  .where(tabla.c.id.in_(ids))
+                  .values(version=tabla.c.version + 1))
+        if conexion.dialect.name == "postgresql":
+            filas = await conexion.execute(update.returning(tabla.c.id,
+                                                            tabla.c.version))
+        else:
+            await conexion.execute(update)
+            filas = await conexion.execute(
+                select(tabla.c.id, tabla.c.version).where(tabla.c.id.in_(ids)))
+        self.info.setdefault("versiones", {}).update(filas.all())
+
+    async def reservar_habitacion(self, conexion, residencia, version,
+                                  habitacion=None):
+        """Como elegir_habitacion de app.py; devuelve (habitacion, motivo
+        del rechazo)."""
+        # Como Censo.obtener, pero reconstruyendo con la conexion async
+        resumen = censo.vigente(residencia, version)
+        if resumen is None:
+            consultas = consultas_resumen(residencia)
+            fila = (await conexion.execute(consultas[0])).first()
+            if fila is not None:
+                resumen = censo.guardar(armar_resumen(
+                    residencia, fila,
+                    await conexion.execute(consultas[1]),
+                    await conexion.execute(consultas[2])))
+        return reservar_en(self.info, resumen, habitacion)
+
+
+@ruta("POST", "/api/login")
+async def api_login(peticion):
+    datos = peticion.json()
+    # Los rechazos por limite o por usuario desconocido no van a la BD
+    mensaje, espera = rechazo_login(datos["user"], peticion.ip)
+    if mensaje:
+        respuesta = Respuesta({"message": mensaje}, 429 if espera else 200)
+        respuesta.retry_after = espera
+        return respuesta
+    tabla = Usuario.__table__
+    async with obtener_motor().connect() as conexion:
+        usuario = (await conexion.execute(
+            select(tabla).where(tabla.c.user == datos["user"]))).first()
+    if usuario is None:
+        limites_login.marcar_desconocido(datos["user"])
+        return Respuesta({"message": "Usuario no existe"})
+    if not password_correcta(usuario, datos["password"]):
+        return Respuesta({"message": "Contraseña incorrecta"})
+    # Sin cookies de sesion: los clientes ASGI siempre usan el token
+    with app.app_context():
+        token = crear_token(usuario)
+    return Respuesta({
+        "message": "Correcto inicio de sesion",
+        "token": token,
+        "expira": app.config["API_TOKEN_MAX_AGE"],
+    })
+
+
+async def stream_pacientes(residencia, after):
+    yield b"["
+    separador = b""
+    async with obtener_motor().connect() as conexion:
+        resultado = await conexion.stream(filtrar_pacientes(
+            select(*COLUMNAS_LISTADO), residencia, after))
+        async for filas in resultado.partitions(LOTE_STREAM):
+            yield separador + filas_json.lote(filas)
+            separador = b","
+    yield b"]"
+
+
+@ruta("GET", "/api/ver_pacientes")
+async def api_ver_pacientes(peticion):
+    residencia = peticion.entero("residencia")
+    after = peticion.entero("after")
+    limit = peticion.entero("limit")
+    async with obtener_motor().connect() as conexion:
+        consulta = select(Residencia.id, Residencia.version)
+        if residencia is not None:
+            consulta = consulta.where(Residencia.id == residencia)
+        versiones = await conexion.execute(consulta.order_by(Residencia.id))
+        etag = etag_de(peticion.ruta_completa, versiones)
+        if peticion.no_modificado(etag):
+            return Respuesta(estado=304, etag=etag)
+        if limit is None or peticion.args.get("stream") == "1":
+            return Respuesta(cuerpo=stream_pacientes(residencia, after),
+                             etag=etag)
+        limit = max(1, min(limit, MAX_LIMIT_PACIENTES))
+        filas = (await conexion.execute(filtrar_pacientes(
+            select(*COLUMNAS_LISTADO), residencia, after).limit(limit))).all()
+    siguiente = None
+    if len(filas) == limit:
+        siguiente = filas[-1][0]
+    # Las filas se escriben directo, sin pasar por dicts
+    return Respuesta(cuerpo=b'{"pacientes":%s,"siguiente":%s}' % (
+        filas_json.lista(filas), serializador.valor(siguiente).encode("ascii")),
+        etag=etag)
+
+
+async def insertar_paciente(dni, datos, res):
+    """Devuelve (mensaje, habitacion); habitacion es None si no se
+    registro."""
+    habitacion = datos.get("habitacion")
+    cambios = Cambios()
+    async with cambios.transaccion() as conexion:
+        existe, version = (await conexion.execute(select(
+            exists().where(Paciente.dni == dni),
+            select(Residencia.version)
+            .where(Residencia.id == res).scalar_subquery(),
+        ))).one()
+        if existe:
+            return "Persona con este DNI ya ha sido registrada", None
+        habitacion, rechazo = await cambios.reservar_habitacion(
+            conexion, res, version, habitacion)
+        if rechazo:
+            return rechazo, None
+        paciente = {
+            "dni": dni,
+            "nombre": datos["nombre"],
+            "apellido": datos["apellido"],
+            "edad": int(datos["edad"]),
+            "habitacion": int(habitacion),
+            "residencia": res,
+        }
+        await conexion.execute(Paciente.__table__.insert().values(**paciente))
+        indice_pacientes.actualizar(dni, paciente["nombre"],
+                                    paciente["apellido"], res)
+        await cambios.subir_versiones(conexion, res)
+        cambios.delta("paciente", res, 1, paciente["habitacion"],
+                      paciente["edad"])
+        await cambios.publicar(conexion, {
+            "tipo": "insert",
+            "dni": dni,
+            "nombre": paciente["nombre"],
+            "apellido": paciente["apellido"],
+            "edad": paciente["edad"],
+            "habitacion": paciente["habitacion"],
+            "residencia_id": res,
+            "usuario": None,
+        })
+    return "Paciente registrado correctamente", paciente["habitacion"]
+
+
+@ruta("POST", "/api/registro_paciente")
+@autenticado
+async def api_registro_paciente(peticion):
+    datos = peticion.json()
+    mensaje, habitacion = await insertar_paciente(
+        int(datos["dni"]), datos, int(datos["residencia"]))
+    if habitacion is None:
+        return Respuesta({"message": mensaje})
+    return Respuesta({"message": mensaje, "habitacion": habitacion})
+
+
+@ruta("POST", r"/api/pacientes/(?P<paciente_id>[^/]+)/registrar")
+@autenticado
+async def api_registrar_paciente(peticion, paciente_id):
+    error = False
+    response = {}
+    try:
+        if len(paciente_id) != 8:
+            response["message"] = "DNI inválido"
+        else:
+            datos = peticion.json()
+            mensaje, habitacion = await insertar_paciente(
+                int(paciente_id), datos, int(datos["residencia_id"]))
+            response["message"] = mensaje
+            if habitacion is None:
+                response["category"] = "error"
+            else:
+                response["category"] = "success"
+                response["habitacion"] = habitacion
+    except Exception:
+        error = True
+
+    if error:
+        response["message"] = "Error en el BE"
+
+    response["error"] = error
+    return Respuesta(response)
+
+
+@ruta("POST", r"/api/pacientes/(?P<paciente_dni>[^/]+)/editar")
+@autenticado
+async def api_editar_paciente(peticion, paciente_dni):
+    error = False
+    response = {}
+    pacientes = Paciente.__table__
+    cambios = Cambios()
+    try:
+        datos = peticion.json()
+        dni = int(datos["dni"])
+        valores = {
+            "nombre": datos["nombre"],
+            "apellido": datos["apellido"],
+            "edad": int(datos["edad"]),
+            "habitacion": int(datos["habitacion"]),
+            "residencia": int(datos["residencia_id"]),
+        }
+        async with cambios.transaccion() as conexion:
+            anterior = (await conexion.execute(
+                select(pacientes).where(pacientes.c.dni == dni)
+                .with_for_update())).one()
+            rechazo = None
+            if ((valores["residencia"], valores["habitacion"])
+                    != (anterior.residencia, anterior.habitacion)):
+                # Moverse reserva la habitacion nueva como en un alta
+                version = (await conexion.execute(
+                    select(Residencia.version)
+                    .where(Residencia.id == valores["residencia"]))).scalar()
+                _, rechazo = await cambios.reservar_habitacion(
+                    conexion, valores["residencia"], version,
+                    valores["habitacion"])
+            if not rechazo:
+                await conexion.execute(
+                    pacientes.update().where(pacientes.c.dni == dni)
+                    .values(**valores))
+                indice_pacientes.actualizar(dni, valores["nombre"],
+                                            valores["apellido"],
+                                            valores["residencia"])
+                fragmentos_html.invalidar(("fila", dni))
+                await cambios.subir_versiones(conexion, anterior.residencia,
+                                              valores["residencia"])
+                cambios.delta("paciente", anterior.residencia, -1,
+                              anterior.habitacion, anterior.edad)
+                cambios.delta("paciente", valores["residencia"], 1,
+                              valores["habitacion"], valores["edad"])
+                evento = {
+                    "tipo": "update",
+                    "dni": dni,
+                    "nombre": valores["nombre"],
+                    "apellido": valores["apellido"],
+                    "edad": valores["edad"],
+                    "habitacion": valores["habitacion"],
+                    "residencia_id": valores["residencia"],
+                    "usuario": anterior.usuario,
+                }
+                if anterior.residencia != valores["residencia"]:
+                    evento["residencia_anterior"] = anterior.residencia
+                await cambios.publicar(conexion, evento)
+        if rechazo:
+            response["message"] = rechazo
+            response["category"] = "error"
+        else:
+            response["message"] = "Paciente editado correctamente"
+    except Exception:
+        error = True
+
+    if error:
+        response["message"] = "Error en BE"
+
+    response["error"] = error
+    return Respuesta(response)
+
+
+class PacienteYaRegistrado(Exception):
+    pass
+
+
+@ruta("POST", r"/api/usuarios/(?P<user>[^/]+)/registrar")
+async def api_registrar_usuario(peticion, user):
+    error = False
+    response = {}
+    nuevo_id = None
+    cambios = Cambios()
+    try:
+        datos = peticion.json()
+        usuario = datos["user"]
+        password = datos["password"]
+        admin = datos["es_admin"] == "1"
+        dni = datos["dni"]
+        if len(dni) != 8:
+            response["message"] = "DNI inválido"
+        else:
+            res = datos.get("residencia_id") if admin else None
+            dialecto = obtener_motor().dialect.name
+            async with cambios.transaccion() as conexion:
+                fila = (await conexion.execute(sentencia_verificar_registro(
+                    int(dni), usuario, res))).one()
+                rechazo = rechazo_registro(fila, admin)
+                if rechazo is None:
+                    nuevo_id = id_usuario_insertado(
+                        dialecto, await conexion.execute(
+                            sentencia_insertar_usuario(dialecto, usuario,
+                                                       password, admin)))
+                if rechazo:
+                    response["message"] = rechazo
+                elif nuevo_id is None:
+                    response["message"] = "Usuario ya existe"
+                elif admin:
+                    await conexion.execute(
+                        PersonalMedico.__table__.insert().values(
+                            dni=int(dni),
+                            nombre=datos["nombre"],
+                            apellido=datos["apellido"],
+                            titulo=datos["titulo"],
+                            especialidad=datos["especialidad"],
+                            residencia=res,
+                            usuario=usuario,
+                        ))
+                    await cambios.subir_versiones(conexion, res)
+                    cambios.delta("personal", int(res), 1, datos["titulo"],
+                                  datos["especialidad"])
+                    response["message"] = "Usuario creado correctamente"
+                else:
+                    pacientes = Paciente.__table__
+                    resultado = await conexion.execute(
+                        pacientes.update()
+                        .where(pacientes.c.dni == fila.dni,
+                               pacientes.c.usuario.is_(None))
+                        .values(usuario=usuario))
+                    if resultado.rowcount == 0:
+                        # Otro registro se adelanto con el mismo paciente
+                        raise PacienteYaRegistrado()
+                    await cambios.publicar(conexion,
+                                           evento_vinculo(fila, usuario))
+                    await cambios.subir_versiones(conexion, fila.residencia)
+                    response["message"] = "Usuario creado"
+            if nuevo_id is not None:
+                cache_usuarios.invalidar(nuevo_id)
+                limites_login.olvidar_desconocido(usuario)
+    except PacienteYaRegistrado:
+        response["message"] = "Paciente ya registrado"
+    except Exception:
+        error = True
+
+    if error:
+        response["message"] = "Error en el BE"
+
+    response["error"] = error
+    return Respuesta(response)
@@ -0,0 +1,2 @@
+from bench.carga import ejecutar, percentil
+from bench.perfiles import PERFILES
@@ -0,0 +1,98 @@
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from bench.carga import ejecutar
+from bench.perfiles import PERFILES
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def iniciar_servidor(tipo, puerto, trabajadores):
+    if tipo == "gunicorn":
+        comando = ["gunicorn", "-c", "gunicorn.conf.py",
+                   "-w", str(trabajadores), "--threads", "4",
+                   "-b", "127.0.0.1:%d" % puerto]
+    else:
+        comando = [sys.executable, "-m", "flask", "run", "--no-reload",
+                   "--with-threads", "--port", str(puerto)]
+    # Todos los clientes entran desde 127.0.0.1 y con el mismo usuario:
+    # sin limites de login
+    entorno = dict(os.environ, FLASK_APP="app:create_app()",
+                   LOGIN_CAPACIDAD_IP=str(10 ** 9),
+                   LOGIN_CAPACIDAD_USUARIO=str(10 ** 9))
+    proceso = subprocess.Popen(comando, cwd=RAIZ, env=entorno,
+                               stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    limite = time.time() + 30
+    while time.time() < limite:
+        if proceso.poll() is not None:
+            raise SystemExit("El servidor termino antes de iniciar")
+        try:
+            socket.create_connection(("127.0.0.1", puerto), timeout=1).close()
+            return proceso
+        except OSError:
+            time.sleep(0.2)
+    proceso.terminate()
+    raise SystemExit("El servidor no respondio en el puerto %d" % puerto)
+
+
+def commit_actual():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=RAIZ,
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m bench",
+        description="Prueba de carga concurrente contra los endpoints reales")
+    parser.add_argument("--url", default="http://127.0.0.1:5002")
+    parser.add_argument("--perfil", choices=sorted(PERFILES),
+                        default="rondas")
+    parser.add_argument("--clientes", type=int, default=20)
+    parser.add_argument("--duracion", type=float, default=30.0)
+    parser.add_argument("--usuario", default="personal0")
+    parser.add_argument("--password", default="1234")
+    parser.add_argument("--residencia", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--iniciar", choices=["flask", "gunicorn"],
+                        help="inicia el servidor antes de la prueba")
+    parser.add_argument("--puerto", type=int, default=5055)
+    parser.add_argument("--trabajadores", type=int, default=4)
+    parser.add_argument("--salida", help="archivo JSON de resultados")
+    args = parser.parse_args()
+
+    proceso = None
+    url = args.url
+    if args.iniciar:
+        proceso = iniciar_servidor(args.iniciar, args.puerto,
+                                   args.trabajadores)
+        url = "http://127.0.0.1:%d" % args.puerto
+    try:
+        resultado = ejecutar(url, args.perfil, args.clientes, args.duracion,
+                             args.usuario, args.password, args.residencia,
+                             args.seed)
+    finally:
+        if proceso is not None:
+            proceso.terminate()
+            proceso.wait()
+    resultado["commit"] = commit_actual()
+    resultado["servidor"] = args.iniciar or url
+
+    salida = json.dumps(resultado, indent=2)
+    if args.salida:
+        with open(args.salida, "w") as archivo:
+            archivo.write(salida + "\n")
+    print(salida)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import json
+import random
+import threading
+import time
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+
+from bench.perfiles import PERFILES
+
+# Las altas usan DNIs de 8 digitos desde aca, repartidos entre los clientes
+DNI_BASE_REGISTRO = 98000000
+DNI_MAXIMO = 99999999
+
+
+class ErrorOperacion(Exception):
+    pass
+
+
+def rango_dnis(numero, clientes):
+    """[desde, hasta) de los DNIs que registra el cliente `numero` de
+    `clientes`, sin solaparse con los demas ni pasar de 8 digitos."""
+    por_cliente = (DNI_MAXIMO + 1 - DNI_BASE_REGISTRO) // clientes
+    if por_cliente < 1:
+        raise ValueError("Demasiados clientes para el rango de DNIs")
+    desde = DNI_BASE_REGISTRO + numero * por_cliente
+    return desde, desde + por_cliente
+
+
+class Cliente:
+    def __init__(self, url, rango, usuario, password, residencia,
+                 habitaciones, rng):
+        self.url = url.rstrip("/")
+        self.usuario = usuario
+        self.password = password
+        self.residencia = residencia
+        # dni -> habitacion de los pacientes que ya estaban
+        self.habitaciones = habitaciones
+        self.dnis = list(habitaciones)
+        self.rng = rng
+        self.siguiente_dni, self.ultimo_dni = rango
+        self.registrados = []
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()))
+
+    def pedir(self, metodo, ruta, datos=None):
+        cuerpo = None
+        headers = {}
+        if datos is not None:
+            cuerpo = json.dumps(datos).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        request = Request(self.url + ruta, data=cuerpo, headers=headers,
+                          method=metodo)
+        try:
+            with self.opener.open(request, timeout=30) as response:
+                contenido = response.read()
+        except HTTPError as e:
+            raise ErrorOperacion("HTTP %d" % e.code)
+        except (URLError, OSError) as e:
+            raise ErrorOperacion(str(e))
+        try:
+            respuesta = json.loads(contenido)
+        except ValueError:
+            raise ErrorOperacion("Respuesta no es JSON")
+        if isinstance(respuesta, dict) and respuesta.get("error") is True:
+            raise ErrorOperacion(respuesta.get("message"))
+        return respuesta
+
+    def login(self):
+        respuesta = self.pedir("POST", "/api/login", {
+            "user": self.usuario,
+            "password": self.password,
+        })
+        if respuesta["message"] != "Correcto inicio de sesion":
+            raise ErrorOperacion(respuesta["message"])
+
+    def ver_pacientes(self):
+        ruta = "/api/ver_pacientes?limit=100&residencia=%d" % self.residencia
+        if self.dnis:
+            ruta += "&after=%d" % self.rng.choice(self.dnis)
+        self.pedir("GET", ruta)
+
+    def registro_paciente(self):
+        if self.siguiente_dni >= self.ultimo_dni:
+            raise ErrorOperacion("No quedan DNIs para registrar")
+        dni = self.siguiente_dni
+        self.siguiente_dni += 1
+        respuesta = self.pedir("POST", "/api/registro_paciente", {
+            "dni": dni,
+            "nombre": "Carga",
+            "apellido": "Prueba",
+            "edad": self.rng.randint(65, 100),
+            "habitacion": "auto",
+            "residencia": self.residencia,
+        })
+        if respuesta["message"] != "Paciente registrado correctamente":
+            raise ErrorOperacion(respuesta["message"])
+        self.registrados.append(dni)
+
+    def editar_paciente(self):
+        if not self.dnis:
+            raise ErrorOperacion("No hay pacientes para editar")
+        dni = self.rng.choice(self.dnis)
+        # Cada paciente se queda en su habitacion: moverlo a una al azar
+        # chocaria con las ocupadas
+        respuesta = self.pedir("POST", "/api/pacientes/%d/editar" % dni, {
+            "dni": dni,
+            "nombre": "Editado",
+            "apellido": "Carga",
+            "edad": self.rng.randint(65, 100),
+            "habitacion": self.habitaciones[dni],
+            "residencia_id": self.residencia,
+        })
+        if respuesta["message"] != "Paciente editado correctamente":
+            raise ErrorOperacion(respuesta["message"])
+
+    def delete_paciente(self):
+        if not self.registrados:
+            return self.registro_paciente()
+        dni = self.registrados.pop()
+        self.pedir("DELETE", "/pacientes/%d/delete-paciente" % dni)
+
+
+def percentil(valores, p):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    indice = max(0, int(round(p / 100.0 * len(ordenados))) - 1)
+    return ordenados[min(indice, len(ordenados) - 1)]
+
+
+def resumen(muestras, duracion):
+    latencias = [latencia for latencia, ok in muestras]
+    errores = sum(1 for latencia, ok in muestras if not ok)
+    return {
+        "peticiones": len(muestras),
+        "errores": errores,
+        "tasa_error": errores / len(muestras) if muestras else 0.0,
+        "throughput": len(muestras) / duracion,
+        "p50_ms": percentil_ms(latencias, 50),
+        "p95_ms": percentil_ms(latencias, 95),
+        "p99_ms": percentil_ms(latencias, 99),
+    }
+
+
+def percentil_ms(latencias, p):
+    valor = percentil(latencias, p)
+    return None if valor is None else round(valor * 1000, 3)
+
+
+def ejecutar(url, perfil="rondas", clientes=10, duracion=30.0,
+             usuario="personal0", password="1234", residencia=1, seed=0):
+    pesos = PERFILES[perfil]
+    operaciones = list(pesos)
+    rng = random.Random(seed)
+    # El preparador es un cliente mas, el ultimo
+    preparador = Cliente(url, rango_dnis(clientes, clientes + 1), usuario,
+                         password, residencia, {}, rng)
+    preparador.login()
+    habitaciones = {paciente["dni"]: paciente["habitacion"]
+                    for paciente in preparador.pedir(
+        "GET", "/api/ver_pacientes?limit=1000&residencia=%d" % residencia
+    )["pacientes"]}
+
+    muestras = {operacion: [] for operacion in operaciones}
+    lock = threading.Lock()
+    fin = time.perf_counter() + duracion
+
+    def trabajar(numero):
+        cliente = Cliente(url, rango_dnis(numero, clientes + 1), usuario,
+                          password, residencia, habitaciones,
+                          random.Random(seed * 1000 + numero))
+        locales = {operacion: [] for operacion in operaciones}
+        try:
+            cliente.login()
+        except ErrorOperacion:
+            pass
+        while time.perf_counter() < fin:
+            operacion = cliente.rng.choices(
+                operaciones, weights=[pesos[op] for op in operaciones])[0]
+            inicio = time.perf_counter()
+            try:
+                getattr(cliente, operacion)()
+                ok = True
+            except ErrorOperacion:
+                ok = False
+            locales[operacion].append((time.perf_counter() - inicio, ok))
+        with lock:
+            for operacion, valores in locales.items():
+                muestras[operacion].extend(valores)
+
+    hilos = [threading.Thread(target=trabajar, args=(numero,))
+             for numero in range(clientes)]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    transcurrido = time.perf_counter() - inicio
+
+    todas = [muestra for valores in muestras.values() for muestra in valores]
+    return {
+        "perfil": perfil,
+        "clientes": clientes,
+        "duracion": round(transcurrido, 3),
+        "seed": seed,
+        "total": resumen(todas, transcurrido),
+        "operaciones": {
+            operacion: resumen(valores, transcurrido)
+            for operacion, valores in muestras.items()
+        },
+    }
@@ -0,0 +1,23 @@
+# Cada perfil asigna un peso relativo a cada operacion de bench.carga
+PERFILES = {
+    # Rondas de sala: casi todo son lecturas del listado
+    "rondas": {
+        "ver_pacientes": 80,
+        "login": 5,
+        "editar_paciente": 15,
+    },
+    # Ingreso masivo: muchas altas y algunas bajas
+    "admision": {
+        "registro_paciente": 60,
+        "ver_pacientes": 20,
+        "editar_paciente": 10,
+        "delete_paciente": 10,
+    },
+    "mixto": {
+        "login": 10,
+        "ver_pacientes": 40,
+        "registro_paciente": 20,
+        "editar_paciente": 20,
+        "delete_paciente": 10,
+    },
+}
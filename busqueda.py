@@ -0,0 +1,114 @@
+import math
+import threading
+import unicodedata
+
+# Mismo valor por defecto que pg_trgm.word_similarity_threshold
+UMBRAL_SIMILITUD = 0.6
+
+
+def normalizar(texto):
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def trigramas(texto):
+    # Igual que pg_trgm: cada palabra se rellena con dos espacios
+    # al inicio y uno al final.
+    resultado = set()
+    for palabra in normalizar(texto).split():
+        palabra = "  " + palabra + " "
+        for i in range(len(palabra) - 2):
+            resultado.add(palabra[i:i + 3])
+    return resultado
+
+
+def rango_dni(prefijo, digitos=8):
+    faltan = digitos - len(prefijo)
+    return int(prefijo) * 10 ** faltan, (int(prefijo) + 1) * 10 ** faltan - 1
+
+
+class IndiceNgramas:
+    """Indice de trigramas en memoria para buscar pacientes por nombre
+    cuando la BD no tiene pg_trgm (SQLite)."""
+
+    def __init__(self, cargar):
+        self.cargar = cargar
+        self.lock = threading.Lock()
+        self.construido = False
+        self.indice = {}
+        self.pacientes = {}
+
+    def construir(self):
+        self.indice = {}
+        self.pacientes = {}
+        for dni, nombre, apellido, residencia in self.cargar():
+            self._agregar(dni, nombre, apellido, residencia)
+        self.construido = True
+
+    def _agregar(self, dni, nombre, apellido, residencia):
+        gramas = trigramas(nombre + " " + apellido)
+        self.pacientes[dni] = (residencia, gramas)
+        for grama in gramas:
+            self.indice.setdefault(grama, set()).add(dni)
+
+    def _quitar(self, dni):
+        datos = self.pacientes.pop(dni, None)
+        if datos is None:
+            return
+        for grama in datos[1]:
+            dnis = self.indice.get(grama)
+            if dnis is not None:
+                dnis.discard(dni)
+                if not dnis:
+                    del self.indice[grama]
+
+    def precargar(self):
+        with self.lock:
+            if not self.construido:
+                self.construir()
+
+    def actualizar(self, dni, nombre, apellido, residencia):
+        with self.lock:
+            if self.construido:
+                self._quitar(dni)
+                self._agregar(dni, nombre, apellido, residencia)
+
+    def quitar(self, dni):
+        with self.lock:
+            if self.construido:
+                self._quitar(dni)
+
+    def invalidar(self):
+        with self.lock:
+            self.construido = False
+            self.indice = {}
+            self.pacientes = {}
+
+    def buscar(self, texto, residencia=None, limit=20):
+        buscados = trigramas(texto)
+        if not buscados:
+            return []
+        with self.lock:
+            if not self.construido:
+                self.construir()
+            # Un paciente con similitud >= UMBRAL_SIMILITUD comparte al menos
+            # `necesarios` trigramas, asi que aparece en alguno de los
+            # len(buscados) - necesarios + 1 conjuntos mas pequeños.
+            necesarios = math.ceil(UMBRAL_SIMILITUD * len(buscados))
+            ordenados = sorted(buscados,
+                               key=lambda grama: len(self.indice.get(grama, ())))
+            candidatos = set()
+            for grama in ordenados[:len(buscados) - necesarios + 1]:
+                candidatos.update(self.indice.get(grama, ()))
+            resultados = []
+            for dni in candidatos:
+                residencia_dni, gramas = self.pacientes[dni]
+                if residencia is not None and residencia_dni != residencia:
+                    continue
+                # Aproxima word_similarity de pg_trgm: fraccion de los
+                # trigramas buscados presentes en el nombre
+                similitud = len(buscados & gramas) / float(len(buscados))
+                if similitud >= UMBRAL_SIMILITUD:
+                    resultados.append((similitud, dni))
+        resultados.sort(key=lambda item: (-item[0], item[1]))
+        return [dni for similitud, dni in resultados[:limit]]
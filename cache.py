@@ -0,0 +1,104 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+FALTA = object()
+
+
+class CacheLRU:
+    """Cache en memoria del proceso con tamaño maximo y expiracion."""
+
+    def __init__(self, max_items=10000, ttl=60):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, clave, default=FALTA):
+        with self.lock:
+            item = self.items.get(clave, FALTA)
+            if item is FALTA:
+                return default
+            valor, expira = item
+            if expira < time.monotonic():
+                del self.items[clave]
+                return default
+            self.items.move_to_end(clave)
+            return valor
+
+    def set(self, clave, valor):
+        with self.lock:
+            self.items[clave] = (valor, time.monotonic() + self.ttl)
+            self.items.move_to_end(clave)
+            while len(self.items) > self.max_items:
+                self.items.popitem(last=False)
+
+    def invalidar(self, clave):
+        with self.lock:
+            self.items.pop(clave, None)
+
+    def limpiar(self):
+        with self.lock:
+            self.items.clear()
+
+
+class CacheRedis:
+    """Misma interfaz que CacheLRU pero compartida entre workers.
+
+    Los valores se guardan como JSON, asi que solo admite tipos simples.
+    """
+
+    def __init__(self, url, prefijo, ttl=60):
+        import redis
+
+        self.cliente = redis.Redis.from_url(url)
+        self.prefijo = prefijo
+        self.ttl = ttl
+
+    def get(self, clave, default=FALTA):
+        valor = self.cliente.get(self.prefijo + str(clave))
+        if valor is None:
+            return default
+        return json.loads(valor)
+
+    def set(self, clave, valor):
+        self.cliente.set(self.prefijo + str(clave), json.dumps(valor),
+                         ex=self.ttl)
+
+    def invalidar(self, clave):
+        self.cliente.delete(self.prefijo + str(clave))
+
+    def limpiar(self):
+        for clave in self.cliente.scan_iter(self.prefijo + "*"):
+            self.cliente.delete(clave)
+
+
+def crear_cache(url=None, prefijo="", max_items=10000, ttl=60):
+    if url:
+        return CacheRedis(url, prefijo, ttl)
+    return CacheLRU(max_items, ttl)
+
+
+class CacheDiferida:
+    """Se importa como cualquier cache y create_app elige despues el
+    backend segun la configuracion, sin cambiar la instancia."""
+
+    def __init__(self, prefijo=""):
+        self.prefijo = prefijo
+        self.cache = CacheLRU()
+
+    def configurar(self, url=None, max_items=10000, ttl=60):
+        self.cache = crear_cache(url, self.prefijo, max_items, ttl)
+
+    def get(self, clave, default=FALTA):
+        return self.cache.get(clave, default)
+
+    def set(self, clave, valor):
+        self.cache.set(clave, valor)
+
+    def invalidar(self, clave):
+        self.cache.invalidar(clave)
+
+    def limpiar(self):
+        self.cache.limpiar()
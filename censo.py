@@ -0,0 +1,171 @@
+import threading
+from collections import Counter
+
+RANGOS_EDAD = ((0, 64, "<65"), (65, 74, "65-74"), (75, 84, "75-84"),
+               (85, 94, "85-94"), (95, None, "95+"))
+
+
+def rango_edad(edad):
+    for minimo, maximo, nombre in RANGOS_EDAD:
+        if edad >= minimo and (maximo is None or edad <= maximo):
+            return nombre
+    return RANGOS_EDAD[0][2]
+
+
+class ResumenResidencia:
+    def __init__(self, id, nombre, no_habitaciones, version):
+        self.id = id
+        self.nombre = nombre
+        self.no_habitaciones = no_habitaciones
+        self.version = version
+        self.pacientes = 0
+        self.habitaciones = Counter()
+        self.edades = Counter()
+        self.personal = Counter()
+        # Mapas de bits: el bit h corresponde a la habitacion h
+        # (1..no_habitaciones)
+        self.ocupadas = 0
+        self.reservadas = 0
+
+    def agregar_paciente(self, habitacion, edad, signo=1):
+        self.pacientes += signo
+        self.habitaciones[habitacion] += signo
+        ocupada = self.habitaciones[habitacion] > 0
+        if not ocupada:
+            del self.habitaciones[habitacion]
+        if (isinstance(habitacion, int) and self.no_habitaciones
+                and 1 <= habitacion <= self.no_habitaciones):
+            if ocupada:
+                self.ocupadas |= 1 << habitacion
+            else:
+                self.ocupadas &= ~(1 << habitacion)
+        self.edades[rango_edad(edad)] += signo
+
+    def mapa_libres(self):
+        if not self.no_habitaciones:
+            return 0
+        todas = (1 << (self.no_habitaciones + 1)) - 2
+        return todas & ~(self.ocupadas | self.reservadas)
+
+    def libres(self, limit=None):
+        mapa = self.mapa_libres()
+        resultado = []
+        while mapa and (limit is None or len(resultado) < limit):
+            bit = mapa & -mapa
+            resultado.append(bit.bit_length() - 1)
+            mapa ^= bit
+        return resultado
+
+    def agregar_personal(self, titulo, especialidad, signo=1):
+        self.personal[(titulo, especialidad)] += signo
+
+    def a_dict(self):
+        ocupadas = len(self.habitaciones)
+        por_titulo = Counter()
+        por_especialidad = Counter()
+        for (titulo, especialidad), cantidad in self.personal.items():
+            por_titulo[titulo] += cantidad
+            por_especialidad[especialidad] += cantidad
+        resumen = {
+            "residencia": self.id,
+            "nombre": self.nombre,
+            "no_habitaciones": self.no_habitaciones,
+            "pacientes": self.pacientes,
+            "habitaciones_ocupadas": ocupadas,
+            "habitaciones_libres": None,
+            "ocupacion": None,
+            "edades": {nombre: self.edades.get(nombre, 0)
+                       for minimo, maximo, nombre in RANGOS_EDAD},
+            "personal": {
+                "total": sum(self.personal.values()),
+                "por_titulo": dict(por_titulo),
+                "por_especialidad": dict(por_especialidad),
+            },
+        }
+        if self.no_habitaciones:
+            resumen["habitaciones_libres"] = max(
+                0, self.no_habitaciones - ocupadas)
+            resumen["ocupacion"] = round(ocupadas / self.no_habitaciones, 4)
+        return resumen
+
+
+class Censo:
+    """Resumen por residencia mantenido en memoria.
+
+    Cada resumen guarda la version de la residencia con la que esta al
+    dia. Los cambios propios se aplican como deltas despues del commit; si
+    otra transaccion (u otro worker) cambio la residencia entre medio, la
+    version no cuadra y el resumen se reconstruye en la siguiente lectura.
+    """
+
+    def __init__(self, reconstruir):
+        self.reconstruir = reconstruir
+        self.lock = threading.Lock()
+        self.resumenes = {}
+
+    def vigente(self, id, version):
+        with self.lock:
+            resumen = self.resumenes.get(id)
+            if resumen is not None and resumen.version == version:
+                return resumen
+        return None
+
+    def guardar(self, resumen):
+        if resumen is not None:
+            with self.lock:
+                self.resumenes[resumen.id] = resumen
+        return resumen
+
+    def obtener(self, id, version):
+        resumen = self.vigente(id, version)
+        if resumen is None:
+            resumen = self.guardar(self.reconstruir(id))
+        return resumen
+
+    def aplicar(self, deltas, versiones):
+        por_residencia = {}
+        for delta in deltas:
+            por_residencia.setdefault(delta[1], []).append(delta)
+        with self.lock:
+            for id, version in versiones.items():
+                resumen = self.resumenes.get(id)
+                if resumen is None:
+                    continue
+                cambios = por_residencia.get(id)
+                if not cambios or resumen.version != version - 1:
+                    del self.resumenes[id]
+                    continue
+                for tipo, residencia, signo, a, b in cambios:
+                    if tipo == "paciente":
+                        resumen.agregar_paciente(a, b, signo)
+                    else:
+                        resumen.agregar_personal(a, b, signo)
+                resumen.version = version
+
+    def reservar(self, resumen, habitacion=None):
+        """Reserva `habitacion` si esta libre, o la primera libre; devuelve
+        la habitacion reservada o None."""
+        if resumen is None:
+            return None
+        with self.lock:
+            mapa = resumen.mapa_libres()
+            if habitacion is not None:
+                mapa &= 1 << habitacion
+            if not mapa:
+                return None
+            habitacion = (mapa & -mapa).bit_length() - 1
+            resumen.reservadas |= 1 << habitacion
+        return habitacion
+
+    def liberar_habitacion(self, id, habitacion):
+        with self.lock:
+            resumen = self.resumenes.get(id)
+            if resumen is not None:
+                resumen.reservadas &= ~(1 << habitacion)
+
+    def invalidar(self, id=None):
+        with self.lock:
+            if id is None:
+                self.resumenes.clear()
+            else:
+                self.resumenes.pop(id, None)
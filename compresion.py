@@ -0,0 +1,128 @@
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+TIPOS_COMPRIMIBLES = (
+    "application/json",
+    "application/javascript",
+    "image/svg+xml",
+    "text/css",
+    "text/csv",
+    "text/html",
+    "text/javascript",
+    "text/plain",
+)
+MINIMO_COMPRESION = 1024
+NIVEL_GZIP = 6
+# La calidad maxima (11) es para precomprimir, no para cada request
+CALIDAD_BROTLI = 5
+
+
+def codificaciones():
+    # En orden de preferencia si el cliente acepta ambas por igual
+    if brotli is not None:
+        return ("br", "gzip")
+    return ("gzip",)
+
+
+def elegir_codificacion(cabecera, disponibles=None):
+    """Devuelve la codificacion de `disponibles` que mejor acepta la
+    cabecera Accept-Encoding, o None."""
+    if not cabecera:
+        return None
+    calidades = {}
+    for parte in cabecera.split(","):
+        nombre, _, parametros = parte.partition(";")
+        calidad = 1.0
+        for parametro in parametros.split(";"):
+            clave, _, valor = parametro.strip().partition("=")
+            if clave == "q":
+                try:
+                    calidad = float(valor)
+                except ValueError:
+                    calidad = 0.0
+        calidades[nombre.strip().lower()] = calidad
+    if disponibles is None:
+        disponibles = codificaciones()
+    mejor = None
+    mejor_calidad = 0.0
+    for codificacion in disponibles:
+        calidad = calidades.get(codificacion, calidades.get("*", 0.0))
+        if calidad > mejor_calidad:
+            mejor, mejor_calidad = codificacion, calidad
+    return mejor
+
+
+def comprimir(datos, codificacion, nivel=None):
+    if codificacion == "br":
+        return brotli.compress(datos, quality=nivel or CALIDAD_BROTLI)
+    compresor = zlib.compressobj(nivel or NIVEL_GZIP, zlib.DEFLATED, 31)
+    return compresor.compress(datos) + compresor.flush()
+
+
+def compresor(codificacion, nivel=None):
+    """Devuelve (comprimir_parte, terminar) para comprimir un stream."""
+    if codificacion == "br":
+        compresor = brotli.Compressor(quality=nivel or CALIDAD_BROTLI)
+        return compresor.process, compresor.finish
+    compresor = zlib.compressobj(nivel or NIVEL_GZIP, zlib.DEFLATED, 31)
+    return compresor.compress, compresor.flush
+
+
+def comprimir_partes(partes, codificacion, nivel=None):
+    comprimir_parte, terminar = compresor(codificacion, nivel)
+    for parte in partes:
+        datos = comprimir_parte(parte)
+        if datos:
+            yield datos
+    yield terminar()
+
+
+class Compresion:
+    """Comprime las respuestas segun Accept-Encoding (brotli si esta
+    instalado, si no gzip). Las respuestas chicas van sin comprimir y los
+    streams se comprimen a medida que se generan."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("COMPRESION_MINIMO", MINIMO_COMPRESION)
+        app.config.setdefault("COMPRESION_TIPOS", TIPOS_COMPRIMIBLES)
+        self.minimo = app.config["COMPRESION_MINIMO"]
+        self.tipos = frozenset(app.config["COMPRESION_TIPOS"])
+        app.after_request(self.comprimir_respuesta)
+        app.extensions["compresion"] = self
+
+    def comprimir_respuesta(self, response):
+        if (response.status_code < 200 or response.status_code in (204, 304)
+                or response.direct_passthrough
+                or "Content-Encoding" in response.headers
+                or response.mimetype not in self.tipos):
+            return response
+        response.vary.add("Accept-Encoding")
+        codificacion = elegir_codificacion(
+            request.headers.get("Accept-Encoding"))
+        if codificacion is None:
+            return response
+        if response.is_streamed:
+            response.response = comprimir_partes(response.iter_encoded(),
+                                                 codificacion)
+            response.headers.pop("Content-Length", None)
+        else:
+            datos = response.get_data()
+            if len(datos) < self.minimo:
+                return response
+            response.set_data(comprimir(datos, codificacion))
+        response.headers["Content-Encoding"] = codificacion
+        # Otra representacion de lo mismo: el ETag pasa a ser debil
+        etag, debil = response.get_etag()
+        if etag and not debil:
+            response.set_etag(etag, weak=True)
+        return response
@@ -1,4 +1,7 @@
-from app import *
+from app import Paciente, PersonalMedico, Residencia, Usuario, create_app, db
+
+app = create_app()
+app.app_context().push()
 
 sanjuan = Residencia(id = 1, nombre = "San Juan", direccion = "Surco", no_habitaciones = 21, director = "Carmen Durant")
 losportales = Residencia(id = 2, nombre = "Los Portales", direccion = "La Molina", no_habitaciones = 23, director = "Erika Guillen")
@@ -0,0 +1,83 @@
+import bisect
+import heapq
+import threading
+import time
+
+
+class DirectorioPersonal:
+    """Personal medico agrupado por residencia y especialidad, en memoria.
+
+    Cada grupo esta ordenado por dni para paginar por keyset con bisect.
+    Los cambios de este proceso lo invalidan despues del commit; el ttl
+    acota cuanto tarda en ver el personal creado por otros workers.
+    """
+
+    def __init__(self, cargar, ttl=60):
+        self.cargar = cargar
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.grupos = None
+        self.expira = 0
+
+    def construir(self):
+        grupos = {}
+        filas = sorted(self.cargar(), key=lambda fila: fila[0])
+        for dni, nombre, apellido, titulo, especialidad, residencia in filas:
+            dnis, personal = grupos.setdefault(residencia, {}).setdefault(
+                especialidad, ([], []))
+            dnis.append(dni)
+            personal.append({
+                "dni": dni,
+                "nombre": nombre,
+                "apellido": apellido,
+                "titulo": titulo,
+                "especialidad": especialidad,
+                "residencia": residencia,
+            })
+        return grupos
+
+    def obtener_grupos(self):
+        with self.lock:
+            if self.grupos is None or self.expira < time.monotonic():
+                self.grupos = self.construir()
+                self.expira = time.monotonic() + self.ttl
+            return self.grupos
+
+    def invalidar(self):
+        with self.lock:
+            self.grupos = None
+
+    def buscar(self, residencia=None, titulo=None, especialidad=None,
+               after=None, limit=100):
+        grupos = self.obtener_grupos()
+        if residencia is not None:
+            por_residencia = [grupos.get(residencia, {})]
+        else:
+            por_residencia = grupos.values()
+        listas = []
+        for especialidades in por_residencia:
+            if especialidad is not None:
+                grupo = especialidades.get(especialidad)
+                if grupo:
+                    listas.append(grupo)
+            else:
+                listas.extend(especialidades.values())
+        iteradores = []
+        for dnis, personal in listas:
+            inicio = 0
+            if after is not None:
+                inicio = bisect.bisect_right(dnis, after)
+            iteradores.append(map(personal.__getitem__,
+                                  range(inicio, len(personal))))
+        if len(iteradores) == 1:
+            candidatos = iteradores[0]
+        else:
+            candidatos = heapq.merge(*iteradores, key=lambda datos: datos["dni"])
+        resultado = []
+        for datos in candidatos:
+            if titulo is not None and datos["titulo"] != titulo:
+                continue
+            resultado.append(datos)
+            if len(resultado) == limit:
+                return resultado, datos["dni"]
+        return resultado, None
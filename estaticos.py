@@ -0,0 +1,94 @@
+import hashlib
+import mimetypes
+import os
+import threading
+
+from flask import Response, abort, request, url_for
+
+from compresion import (
+    TIPOS_COMPRIMIBLES,
+    brotli,
+    comprimir,
+    elegir_codificacion,
+)
+
+CACHE_INMUTABLE = "public, max-age=31536000, immutable"
+
+
+class Archivo:
+    def __init__(self, nombre, datos):
+        base, extension = os.path.splitext(nombre)
+        self.huella = hashlib.sha256(datos).hexdigest()[:12]
+        self.nombre = "%s.%s%s" % (base, self.huella, extension)
+        self.mimetype = (mimetypes.guess_type(nombre)[0]
+                         or "application/octet-stream")
+        self.variantes = {None: datos}
+        if self.mimetype in TIPOS_COMPRIMIBLES:
+            # Se comprime una sola vez, con el nivel maximo
+            self.agregar_variante("gzip", comprimir(datos, "gzip", 9))
+            if brotli is not None:
+                self.agregar_variante("br", comprimir(datos, "br", 11))
+
+    def agregar_variante(self, codificacion, datos):
+        if len(datos) < len(self.variantes[None]):
+            self.variantes[codificacion] = datos
+
+
+class Estaticos:
+    """Sirve static/ en /assets con el hash del contenido en el nombre
+    (logo.3f2a9c1b7d0e.jpg), cache de un año y las versiones gzip/brotli
+    calculadas al cargar. En las plantillas: `{{ asset("logo.jpg") }}`."""
+
+    def __init__(self, app=None):
+        self.lock = threading.Lock()
+        self.archivos = None
+        self.por_huella = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.carpeta = app.static_folder
+        app.add_url_rule("/assets/<path:nombre>", "assets", self.servir)
+        app.jinja_env.globals["asset"] = self.url
+        app.extensions["estaticos"] = self
+
+    def cargar(self):
+        with self.lock:
+            if self.archivos is None:
+                archivos = {}
+                for raiz, _, nombres in os.walk(self.carpeta):
+                    for nombre in nombres:
+                        ruta = os.path.join(raiz, nombre)
+                        relativa = os.path.relpath(ruta, self.carpeta)
+                        with open(ruta, "rb") as archivo:
+                            archivos[relativa.replace(os.sep, "/")] = Archivo(
+                                relativa, archivo.read())
+                self.por_huella = {archivo.nombre.replace(os.sep, "/"): archivo
+                                   for archivo in archivos.values()}
+                self.archivos = archivos
+        return self.archivos
+
+    def url(self, nombre):
+        archivo = self.cargar().get(nombre)
+        if archivo is None:
+            return url_for("static", filename=nombre)
+        return url_for("assets", nombre=archivo.nombre)
+
+    def servir(self, nombre):
+        self.cargar()
+        archivo = self.por_huella.get(nombre)
+        if archivo is None:
+            abort(404)
+        disponibles = [codificacion for codificacion in ("br", "gzip")
+                       if codificacion in archivo.variantes]
+        codificacion = elegir_codificacion(
+            request.headers.get("Accept-Encoding"), disponibles)
+        response = Response(archivo.variantes[codificacion],
+                            mimetype=archivo.mimetype)
+        if codificacion:
+            response.headers["Content-Encoding"] = codificacion
+        if len(archivo.variantes) > 1:
+            response.vary.add("Accept-Encoding")
+        response.headers["Cache-Control"] = CACHE_INMUTABLE
+        response.set_etag(archivo.huella)
+        return response.make_conditional(request)
@@ -0,0 +1,171 @@
+import json
+import logging
+import queue
+import select
+import threading
+import time
+
+from sqlalchemy import func
+from sqlalchemy import select as sql_select
+
+CANAL = "pacientes_cambios"
+# Reintentos del LISTEN si se cae la conexion: 0.5s, 1s, 2s... hasta 30s
+ESPERA_MINIMA = 0.5
+ESPERA_MAXIMA = 30
+
+log = logging.getLogger(__name__)
+
+
+def sentencia_notificar(evento):
+    return sql_select(func.pg_notify(CANAL, json.dumps(evento)))
+
+
+class Suscripcion:
+    def __init__(self, residencia=None):
+        self.residencia = residencia
+        self.cola = queue.Queue(maxsize=1000)
+
+    def acepta(self, evento):
+        return (self.residencia is None
+                or evento.get("residencia_id") == self.residencia
+                or evento.get("residencia_anterior") == self.residencia)
+
+    def siguiente(self, timeout):
+        try:
+            return self.cola.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class BusMemoria:
+    """Pub/sub dentro del proceso. Los eventos se guardan en la sesion y
+    solo se entregan si la transaccion hace commit."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.suscripciones = set()
+
+    def suscribir(self, residencia=None):
+        suscripcion = Suscripcion(residencia)
+        with self.lock:
+            self.suscripciones.add(suscripcion)
+        return suscripcion
+
+    def cancelar(self, suscripcion):
+        with self.lock:
+            self.suscripciones.discard(suscripcion)
+
+    def entregar(self, evento, a_todas=False):
+        with self.lock:
+            suscripciones = list(self.suscripciones)
+        for suscripcion in suscripciones:
+            if a_todas or suscripcion.acepta(evento):
+                try:
+                    suscripcion.cola.put_nowait(evento)
+                except queue.Full:
+                    # Un cliente que no lee no debe frenar a los demas
+                    pass
+
+    def cantidad(self):
+        with self.lock:
+            return len(self.suscripciones)
+
+    def publicar(self, session, connection, evento):
+        session.info.setdefault("eventos_pacientes", []).append(evento)
+
+    def despues_commit(self, session):
+        for evento in session.info.pop("eventos_pacientes", []):
+            self.entregar(evento)
+
+    def despues_rollback(self, session):
+        session.info.pop("eventos_pacientes", None)
+
+
+class BusPostgres(BusMemoria):
+    """Usa LISTEN/NOTIFY: el NOTIFY va dentro de la transaccion, asi que
+    PostgreSQL lo entrega a todos los procesos solo despues del commit."""
+
+    def __init__(self, conectar):
+        super().__init__()
+        self.conectar = conectar
+        self.hilo = None
+
+    def publicar(self, session, connection, evento):
+        connection.execute(sentencia_notificar(evento))
+
+    def despues_commit(self, session):
+        pass
+
+    def suscribir(self, residencia=None):
+        with self.lock:
+            if self.hilo is None:
+                self.hilo = threading.Thread(target=self.escuchar, daemon=True)
+                self.hilo.start()
+        return super().suscribir(residencia)
+
+    def escuchar(self):
+        # Si se cae la conexion se reintenta con espera creciente mientras
+        # haya suscriptores; al salir, el proximo suscribir arranca otro hilo
+        espera = ESPERA_MINIMA
+        conectado = False
+        try:
+            while True:
+                try:
+                    conexion = self.conectar()
+                except Exception:
+                    log.exception("No se pudo conectar el LISTEN")
+                else:
+                    espera = ESPERA_MINIMA
+                    if conectado:
+                        # Lo publicado mientras no escuchabamos se perdio
+                        self.entregar({"tipo": "recargar"}, a_todas=True)
+                    conectado = True
+                    try:
+                        self.recibir(conexion)
+                    except Exception:
+                        log.exception("Se perdio la conexion del LISTEN")
+                    finally:
+                        try:
+                            conexion.close()
+                        except Exception:
+                            pass
+                with self.lock:
+                    if not self.suscripciones:
+                        self.hilo = None
+                        return
+                time.sleep(espera)
+                espera = min(espera * 2, ESPERA_MAXIMA)
+        finally:
+            with self.lock:
+                if self.hilo is threading.current_thread():
+                    self.hilo = None
+
+    def recibir(self, conexion):
+        conexion.set_session(autocommit=True)
+        cursor = conexion.cursor()
+        cursor.execute("LISTEN " + CANAL)
+        while True:
+            if select.select([conexion], [], [], 5) == ([], [], []):
+                continue
+            conexion.poll()
+            while conexion.notifies:
+                notificacion = conexion.notifies.pop(0)
+                self.entregar(json.loads(notificacion.payload))
+
+
+class BusDiferido:
+    """El bus que usa la app: en memoria hasta que init_app ve que la BD
+    es PostgreSQL y pasa a LISTEN/NOTIFY."""
+
+    def __init__(self):
+        self.bus = BusMemoria()
+
+    def init_app(self, app, conectar):
+        if app.config["SQLALCHEMY_DATABASE_URI"].startswith("postgresql"):
+            if not isinstance(self.bus, BusPostgres):
+                self.bus = BusPostgres(conectar)
+        elif isinstance(self.bus, BusPostgres):
+            self.bus = BusMemoria()
+
+    def __getattr__(self, nombre):
+        return getattr(self.bus, nombre)
@@ -0,0 +1,189 @@
+import argparse
+import csv
+import io
+import itertools
+import sys
+
+from compresion import comprimir_partes
+
+FORMATOS = ("csv", "arrow", "parquet")
+LOTE_EXPORTACION = 10000
+
+# (columna, tipo arrow) en el orden en que se exportan
+COLUMNAS_EXPORTACION = {
+    "pacientes": (
+        ("dni", "int64"),
+        ("nombre", "string"),
+        ("apellido", "string"),
+        ("edad", "int32"),
+        ("habitacion", "int32"),
+        ("residencia", "int32"),
+        ("usuario", "string"),
+    ),
+    "personal": (
+        ("dni", "int64"),
+        ("nombre", "string"),
+        ("apellido", "string"),
+        ("titulo", "string"),
+        ("especialidad", "string"),
+        ("residencia", "int32"),
+        ("usuario", "string"),
+    ),
+}
+
+TIPOS_CONTENIDO = {
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def hay_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def por_lotes(filas, tamano=LOTE_EXPORTACION):
+    filas = iter(filas)
+    while True:
+        lote = list(itertools.islice(filas, tamano))
+        if not lote:
+            return
+        yield lote
+
+
+def codificar_csv(columnas, lotes):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow([nombre for nombre, tipo in columnas])
+    for lote in lotes:
+        escritor.writerows(lote)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class SalidaIncremental(io.RawIOBase):
+    """Archivo de solo escritura que se vacia despues de cada lote, para
+    que pyarrow escriba en memoria sin acumular todo el archivo."""
+
+    def __init__(self):
+        super().__init__()
+        self.partes = []
+        self.posicion = 0
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        datos = bytes(datos)
+        self.partes.append(datos)
+        self.posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self.posicion
+
+    def vaciar(self):
+        datos = b"".join(self.partes)
+        self.partes = []
+        return datos
+
+
+def codificar_arrow(columnas, lotes, formato, comprimir=False):
+    import pyarrow as pa
+
+    esquema = pa.schema([(nombre, tipo) for nombre, tipo in columnas])
+    salida = SalidaIncremental()
+    if formato == "parquet":
+        import pyarrow.parquet as pq
+
+        escritor = pq.ParquetWriter(
+            salida, esquema, compression="gzip" if comprimir else "snappy")
+    else:
+        escritor = pa.ipc.new_stream(salida, esquema)
+    for lote in lotes:
+        # Se arma cada columna de una vez en lugar de un objeto por fila
+        valores = list(zip(*lote))
+        escritor.write_batch(pa.RecordBatch.from_arrays(
+            [pa.array(valores[i], type=campo.type)
+             for i, campo in enumerate(esquema)],
+            schema=esquema,
+        ))
+        datos = salida.vaciar()
+        if datos:
+            yield datos
+    escritor.close()
+    datos = salida.vaciar()
+    if datos:
+        yield datos
+
+
+def comprimir_gzip(partes):
+    return comprimir_partes(partes, "gzip")
+
+
+def exportar(tipo, filas, formato="csv", gzip=False, tamano=LOTE_EXPORTACION):
+    """Genera el archivo de exportacion en partes de bytes, un lote de
+    filas a la vez."""
+    if formato not in FORMATOS:
+        raise ValueError("Formato no soportado: %s" % formato)
+    if formato != "csv" and not hay_pyarrow():
+        raise ValueError("El formato %s requiere pyarrow" % formato)
+    columnas = COLUMNAS_EXPORTACION[tipo]
+    lotes = por_lotes(filas, tamano)
+    if formato == "csv":
+        partes = codificar_csv(columnas, lotes)
+    else:
+        partes = codificar_arrow(columnas, lotes, formato,
+                                 comprimir=gzip and formato == "parquet")
+    # Parquet ya comprime internamente
+    if gzip and formato != "parquet":
+        partes = comprimir_gzip(partes)
+    return partes
+
+
+def nombre_archivo(tipo, formato, gzip=False):
+    nombre = "%s.%s" % (tipo, formato)
+    if gzip and formato != "parquet":
+        nombre += ".gz"
+    return nombre
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Exporta pacientes o personal sin cargarlos en memoria")
+    parser.add_argument("tipo", choices=sorted(COLUMNAS_EXPORTACION))
+    parser.add_argument("--formato", choices=FORMATOS, default="csv")
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("--residencia", type=int)
+    parser.add_argument("--lote", type=int, default=LOTE_EXPORTACION)
+    parser.add_argument("-o", "--salida",
+                        help="archivo de salida (por defecto stdout)")
+    args = parser.parse_args()
+
+    from app import consulta_exportacion, create_app
+
+    with create_app().app_context():
+        try:
+            partes = exportar(args.tipo,
+                              consulta_exportacion(args.tipo, args.residencia,
+                                                   args.lote),
+                              args.formato, args.gzip, args.lote)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        if args.salida:
+            archivo = open(args.salida, "wb")
+        else:
+            archivo = sys.stdout.buffer
+        try:
+            for parte in partes:
+                archivo.write(parte)
+        finally:
+            if args.salida:
+                archivo.close()
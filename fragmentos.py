@@ -0,0 +1,81 @@
+import sys
+import threading
+from collections import OrderedDict
+
+MAX_BYTES_FRAGMENTOS = 32 * 1024 * 1024
+
+
+def tamano(valor):
+    # Aproximado: lo que ocupan el HTML y la version guardada
+    if isinstance(valor, tuple):
+        return sys.getsizeof(valor) + sum(map(tamano, valor))
+    return sys.getsizeof(valor)
+
+
+class CacheFragmentos:
+    """HTML ya renderizado, en un LRU acotado por memoria.
+
+    Cada entrada guarda junto al HTML la version con la que se genero
+    (para una fila, sus propios valores); si la version no coincide se
+    vuelve a renderizar, asi que nunca se sirve un fragmento viejo. Las
+    rutas de escritura igual invalidan lo que cambian para liberar
+    memoria.
+    """
+
+    def __init__(self, max_bytes=MAX_BYTES_FRAGMENTOS):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.items = OrderedDict()
+        self.bytes = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+
+    def init_app(self, app):
+        app.config.setdefault("FRAGMENTOS_MAX_BYTES", MAX_BYTES_FRAGMENTOS)
+        self.max_bytes = app.config["FRAGMENTOS_MAX_BYTES"]
+        app.extensions["fragmentos"] = self
+
+    def obtener(self, clave, version, generar):
+        with self.lock:
+            item = self.items.get(clave)
+            if item is not None and item[0] == version:
+                self.items.move_to_end(clave)
+                self.aciertos += 1
+                return item[1]
+            self.fallos += 1
+        html = generar()
+        self.guardar(clave, version, html)
+        return html
+
+    def guardar(self, clave, version, html):
+        ocupa = tamano((clave, version, html))
+        if ocupa > self.max_bytes:
+            return
+        with self.lock:
+            anterior = self.items.pop(clave, None)
+            if anterior is not None:
+                self.bytes -= anterior[2]
+            self.items[clave] = (version, html, ocupa)
+            self.bytes += ocupa
+            while self.bytes > self.max_bytes:
+                _, (_, _, liberado) = self.items.popitem(last=False)
+                self.bytes -= liberado
+                self.desalojos += 1
+
+    def invalidar(self, clave):
+        with self.lock:
+            item = self.items.pop(clave, None)
+            if item is not None:
+                self.bytes -= item[2]
+
+    def invalidar_tipo(self, tipo):
+        # Las claves son tuplas que empiezan por el tipo ("fila", "pagina")
+        with self.lock:
+            for clave in [clave for clave in self.items if clave[0] == tipo]:
+                self.bytes -= self.items.pop(clave)[2]
+
+    def limpiar(self):
+        with self.lock:
+            self.items.clear()
+            self.bytes = 0
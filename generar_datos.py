@@ -0,0 +1,170 @@
+import argparse
+import random
+import time
+
+from sqlalchemy import text
+
+from app import (
+    create_app,
+    db,
+    insertar_lote,
+    Usuario,
+    PersonalMedico,
+    Residencia,
+    Paciente,
+)
+
+NOMBRES = [
+    "Santiago", "Fabricio", "Esteban", "Romario", "Luis", "Fátima", "Micaela",
+    "Luciana", "Haydi", "Daniela", "Carmen", "Erika", "Francisco", "Pedro",
+    "Sebastian", "Elizabeth", "Rosa", "Jorge", "María", "José", "Ana",
+    "Carlos", "Teresa", "Manuel", "Julia", "Víctor", "Elena", "Raúl",
+]
+APELLIDOS = [
+    "Gutierrez", "Santos", "Gambirazio", "Vega", "Rodriguez", "Novoa",
+    "Chavez", "Balta", "Durand", "Tafur", "Magot", "Mori", "Meza", "Torres",
+    "Huamán", "Quispe", "Flores", "Ramírez", "Mendoza", "Castillo", "Rojas",
+    "Vargas", "Paredes", "Salazar", "Cárdenas", "Espinoza", "Ríos",
+]
+DISTRITOS = [
+    "Surco", "La Molina", "Miraflores", "San Isidro", "Barranco", "Lince",
+    "Jesús María", "San Borja", "Magdalena", "Pueblo Libre", "Chorrillos",
+]
+ESPECIALIDADES = {
+    "Doctor": ["Neurología", "Cardiologia", "Traumatologia", "Endocrinologia",
+               "Neumologia", "Geriatria", "Medicina Interna"],
+    "Enfermera": ["Geriatria", "Cuidados Intensivos", "Rehabilitacion"],
+}
+
+
+def generar_residencias(rng, cantidad):
+    for id in range(1, cantidad + 1):
+        yield {
+            "id": id,
+            "nombre": "Residencia %d" % id,
+            "direccion": rng.choice(DISTRITOS),
+            "no_habitaciones": rng.randint(20, 400),
+            "director": ("%s %s" % (rng.choice(NOMBRES),
+                                    rng.choice(APELLIDOS)))[:20],
+        }
+
+
+def generar_personal(rng, dnis, residencias):
+    for numero, dni in enumerate(dnis):
+        nombre = rng.choice(NOMBRES)
+        apellido = rng.choice(APELLIDOS)
+        titulo = rng.choice(list(ESPECIALIDADES))
+        usuario = {
+            "user": "personal%d" % numero,
+            "password": "1234",
+            "es_admin": True,
+        }
+        personal = {
+            "dni": dni,
+            "nombre": nombre,
+            "apellido": apellido,
+            "titulo": titulo,
+            "especialidad": rng.choice(ESPECIALIDADES[titulo]),
+            "usuario": usuario["user"],
+            "residencia": rng.choice(residencias)["id"],
+        }
+        yield usuario, personal
+
+
+def generar_pacientes(rng, dnis, residencias, proporcion_usuarios):
+    for numero, dni in enumerate(dnis):
+        residencia = rng.choice(residencias)
+        usuario = None
+        if rng.random() < proporcion_usuarios:
+            usuario = {
+                "user": "paciente%d" % numero,
+                "password": "1234",
+                "es_admin": False,
+            }
+        paciente = {
+            "dni": dni,
+            "nombre": rng.choice(NOMBRES),
+            "apellido": rng.choice(APELLIDOS),
+            "edad": rng.randint(65, 105),
+            "habitacion": rng.randint(1, residencia["no_habitaciones"]),
+            "residencia": residencia["id"],
+            "usuario": usuario["user"] if usuario else None,
+        }
+        yield usuario, paciente
+
+
+def escribir_por_lotes(tabla, filas, tamano_lote):
+    usuarios, lote = [], []
+    for usuario, fila in filas:
+        if usuario:
+            usuarios.append(usuario)
+        lote.append(fila)
+        if len(lote) >= tamano_lote:
+            volcar(tabla, usuarios, lote)
+            usuarios, lote = [], []
+    if lote:
+        volcar(tabla, usuarios, lote)
+
+
+def volcar(tabla, usuarios, lote):
+    # Los usuarios van primero por la FK usuario.user
+    if usuarios:
+        insertar_lote(Usuario.__table__, ("user", "password", "es_admin"),
+                      usuarios)
+    insertar_lote(tabla, tuple(lote[0]), lote)
+
+
+def ajustar_secuencia(tabla):
+    # COPY con ids explicitos no avanza la secuencia del serial: sin esto
+    # la proxima residencia creada por la app chocaria con id 1
+    connection = db.session.connection()
+    if connection.dialect.name == "postgresql":
+        connection.execute(text(
+            "SELECT setval(pg_get_serial_sequence(:tabla, 'id'), "
+            "(SELECT MAX(id) FROM %s))" % tabla.name), {"tabla": tabla.name})
+
+
+def generar(residencias, personal, pacientes, seed=0,
+            proporcion_usuarios=0.1, tamano_lote=10000):
+    rng = random.Random(seed)
+    if Residencia.query.first() is not None:
+        raise SystemExit("La base de datos ya tiene datos, use una vacia")
+    lista_residencias = list(generar_residencias(rng, residencias))
+    insertar_lote(Residencia.__table__, tuple(lista_residencias[0]),
+                  lista_residencias)
+    ajustar_secuencia(Residencia.__table__)
+    dnis = rng.sample(range(10000000, 100000000), personal + pacientes)
+    escribir_por_lotes(
+        PersonalMedico.__table__,
+        generar_personal(rng, dnis[:personal], lista_residencias),
+        tamano_lote,
+    )
+    escribir_por_lotes(
+        Paciente.__table__,
+        generar_pacientes(rng, dnis[personal:], lista_residencias,
+                          proporcion_usuarios),
+        tamano_lote,
+    )
+    db.session.commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Genera datos sinteticos para pruebas de carga")
+    parser.add_argument("--residencias", type=int, default=10)
+    parser.add_argument("--personal", type=int, default=200)
+    parser.add_argument("--pacientes", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--proporcion-usuarios", type=float, default=0.1,
+                        help="fraccion de pacientes con usuario propio")
+    parser.add_argument("--lote", type=int, default=10000)
+    parser.add_argument("--crear-tablas", action="store_true")
+    args = parser.parse_args()
+
+    with create_app().app_context():
+        if args.crear_tablas:
+            db.create_all()
+        inicio = time.time()
+        generar(args.residencias, args.personal, args.pacientes, args.seed,
+                args.proporcion_usuarios, args.lote)
+        print("Datos generados en %.2f s" % (time.time() - inicio))
@@ -0,0 +1,43 @@
+"""Configuracion de gunicorn: `gunicorn -c gunicorn.conf.py`.
+
+La app se carga una sola vez en el proceso principal (preload_app) y se
+precalienta antes del fork, asi los workers arrancan en milisegundos y
+comparten copy-on-write los mappers, las plantillas compiladas y los
+indices en memoria. Cada worker descarta el pool heredado al nacer.
+
+El stream SSE (/api/pacientes/stream) ocupa un hilo mientras el cliente
+esta conectado. Con los workers gthread (por defecto) se aceptan a lo
+sumo la mitad de los hilos de cada worker en streams; para muchos
+suscriptores usar GUNICORN_WORKER_CLASS=gevent, donde no hay limite.
+"""
+import gc
+import os
+
+wsgi_app = "app:create_app()"
+preload_app = True
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5002")
+workers = int(os.environ.get("GUNICORN_WORKERS", 4))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+WORKERS_ASYNC = ("gevent", "eventlet")
+
+
+def on_starting(server):
+    from app import precalentar
+
+    app = server.app.wsgi()
+    # server.cfg ya incluye lo que se paso por linea de comandos
+    if (server.cfg.worker_class_str not in WORKERS_ASYNC
+            and app.config["SSE_MAX_SUSCRIPTORES"] is None):
+        app.config["SSE_MAX_SUSCRIPTORES"] = max(1, server.cfg.threads // 2)
+    precalentar(app)
+    # Lo cargado hasta aca no lo vuelve a recorrer el GC de los workers,
+    # que si no tocaria (y copiaria) cada pagina de memoria compartida
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from app import despues_de_fork
+
+    despues_de_fork(server.app.wsgi())
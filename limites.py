@@ -0,0 +1,141 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from cache import crear_cache
+
+# Los intentos de login se recargan de a poco: `capacidad` seguidos y
+# despues `recarga` por segundo
+CAPACIDAD_USUARIO = 5
+RECARGA_USUARIO = 5 / 60
+CAPACIDAD_IP = 30
+RECARGA_IP = 30 / 60
+MAX_CUBOS = 100000
+TTL_DESCONOCIDOS = 60
+
+
+class CubosMemoria:
+    """Token buckets en el proceso: por clave solo (tokens, instante), en
+    un LRU acotado. Un cubo desalojado vuelve lleno, que es lo mismo que
+    pasaria tras esperar lo suficiente."""
+
+    def __init__(self, max_cubos=MAX_CUBOS):
+        self.max_cubos = max_cubos
+        self.lock = threading.Lock()
+        self.cubos = OrderedDict()
+
+    def tomar(self, clave, capacidad, recarga, ahora=None):
+        """Gasta un token; devuelve 0 o los segundos hasta el proximo."""
+        if ahora is None:
+            ahora = time.monotonic()
+        with self.lock:
+            tokens, antes = self.cubos.pop(clave, (capacidad, ahora))
+            tokens = min(capacidad, tokens + (ahora - antes) * recarga)
+            espera = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                espera = (1 - tokens) / recarga
+            self.cubos[clave] = (tokens, ahora)
+            while len(self.cubos) > self.max_cubos:
+                self.cubos.popitem(last=False)
+        return espera
+
+    def limpiar(self):
+        with self.lock:
+            self.cubos.clear()
+
+
+TOMAR_REDIS = """
+local capacidad = tonumber(ARGV[1])
+local recarga = tonumber(ARGV[2])
+local ahora = tonumber(ARGV[3])
+local cubo = redis.call('HMGET', KEYS[1], 't', 'a')
+local tokens = tonumber(cubo[1]) or capacidad
+local antes = tonumber(cubo[2]) or ahora
+tokens = math.min(capacidad, tokens + math.max(0, ahora - antes) * recarga)
+local espera = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    espera = (1 - tokens) / recarga
+end
+redis.call('HSET', KEYS[1], 't', tostring(tokens), 'a', tostring(ahora))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacidad / recarga))
+return tostring(espera)
+"""
+
+
+class CubosRedis:
+    """Misma interfaz que CubosMemoria pero compartida entre workers; el
+    cubo se actualiza en un solo script de Lua."""
+
+    def __init__(self, url, prefijo="login:"):
+        import redis
+
+        self.cliente = redis.Redis.from_url(url)
+        self.prefijo = prefijo
+        self.script = self.cliente.register_script(TOMAR_REDIS)
+
+    def tomar(self, clave, capacidad, recarga, ahora=None):
+        if ahora is None:
+            ahora = time.time()
+        return float(self.script(keys=[self.prefijo + clave],
+                                 args=[capacidad, recarga, ahora]))
+
+    def limpiar(self):
+        for clave in self.cliente.scan_iter(self.prefijo + "*"):
+            self.cliente.delete(clave)
+
+
+class LimitesLogin:
+    """Frena los intentos de login por usuario y por IP antes de tocar la
+    BD, y recuerda los usuarios que no existen para no volver a buscarlos.
+
+    Con LOGIN_LIMITES_URL (Redis) los cubos y los usuarios desconocidos se
+    comparten entre workers; si no, cada proceso lleva los suyos.
+    """
+
+    def __init__(self, app=None):
+        self.cubos = CubosMemoria()
+        self.desconocidos = crear_cache(ttl=TTL_DESCONOCIDOS)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("LOGIN_LIMITES_URL", None)
+        app.config.setdefault("LOGIN_CAPACIDAD_USUARIO", CAPACIDAD_USUARIO)
+        app.config.setdefault("LOGIN_RECARGA_USUARIO", RECARGA_USUARIO)
+        app.config.setdefault("LOGIN_CAPACIDAD_IP", CAPACIDAD_IP)
+        app.config.setdefault("LOGIN_RECARGA_IP", RECARGA_IP)
+        self.usuario = (app.config["LOGIN_CAPACIDAD_USUARIO"],
+                        app.config["LOGIN_RECARGA_USUARIO"])
+        self.ip = (app.config["LOGIN_CAPACIDAD_IP"],
+                   app.config["LOGIN_RECARGA_IP"])
+        url = app.config["LOGIN_LIMITES_URL"]
+        self.cubos = CubosRedis(url) if url else CubosMemoria()
+        self.desconocidos = crear_cache(url, prefijo="login_desconocido:",
+                                        ttl=TTL_DESCONOCIDOS)
+        app.extensions["limites_login"] = self
+
+    def espera(self, usuario, ip):
+        """Segundos enteros que hay que esperar para intentar de nuevo, o
+        0 si el intento puede seguir."""
+        espera = self.cubos.tomar("ip:%s" % ip, *self.ip)
+        if not espera:
+            espera = self.cubos.tomar("usuario:%s" % usuario, *self.usuario)
+        return math.ceil(espera)
+
+    def desconocido(self, usuario):
+        return self.desconocidos.get(usuario, False)
+
+    def marcar_desconocido(self, usuario):
+        self.desconocidos.set(usuario, True)
+
+    def olvidar_desconocido(self, usuario):
+        self.desconocidos.invalidar(usuario)
+
+    def limpiar(self):
+        self.cubos.limpiar()
+        self.desconocidos.limpiar()
@@ -0,0 +1,129 @@
+import heapq
+import threading
+import time
+
+from flask import Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_CONSULTAS_LENTAS = 10
+
+
+class Histograma:
+    def __init__(self):
+        self.conteos = [0] * len(BUCKETS)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.suma += valor
+        self.total += 1
+        for i, limite in enumerate(BUCKETS):
+            if valor <= limite:
+                self.conteos[i] += 1
+
+
+class Metricas:
+    """Latencia por endpoint y consultas SQL por request, en formato
+    Prometheus en /metrics."""
+
+    def __init__(self, app=None):
+        self.lock = threading.Lock()
+        self.latencias = {}
+        self.consultas = {}
+        self.tiempo_db = {}
+        self.lentas = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("METRICAS_HEADER_DEBUG", False)
+        app.before_request(self.inicio_request)
+        app.after_request(self.fin_request)
+        app.add_url_rule("/metrics", "metrics", self.exportar)
+        if not event.contains(Engine, "before_cursor_execute",
+                              self.antes_consulta):
+            event.listen(Engine, "before_cursor_execute", self.antes_consulta)
+            event.listen(Engine, "after_cursor_execute", self.despues_consulta)
+        app.extensions["metricas"] = self
+
+    def antes_consulta(self, conn, cursor, statement, parameters, context,
+                       executemany):
+        conn.info.setdefault("inicio_consulta", []).append(time.perf_counter())
+
+    def despues_consulta(self, conn, cursor, statement, parameters, context,
+                         executemany):
+        duracion = time.perf_counter() - conn.info["inicio_consulta"].pop()
+        if has_request_context() and "consultas" in g:
+            g.consultas += 1
+            g.tiempo_db += duracion
+        with self.lock:
+            item = (duracion, statement)
+            if len(self.lentas) < MAX_CONSULTAS_LENTAS:
+                heapq.heappush(self.lentas, item)
+            elif duracion > self.lentas[0][0]:
+                heapq.heapreplace(self.lentas, item)
+
+    def inicio_request(self):
+        g.inicio_request = time.perf_counter()
+        g.consultas = 0
+        g.tiempo_db = 0.0
+
+    def fin_request(self, response):
+        if "inicio_request" not in g:
+            return response
+        endpoint = request.endpoint or "desconocido"
+        duracion = time.perf_counter() - g.inicio_request
+        with self.lock:
+            self.latencias.setdefault(endpoint, Histograma()).observar(duracion)
+            self.consultas[endpoint] = (
+                self.consultas.get(endpoint, 0) + g.consultas)
+            self.tiempo_db[endpoint] = (
+                self.tiempo_db.get(endpoint, 0.0) + g.tiempo_db)
+        if current_app.config["METRICAS_HEADER_DEBUG"]:
+            response.headers["X-Query-Count"] = str(g.consultas)
+            response.headers["X-DB-Time"] = "%.6f" % g.tiempo_db
+        return response
+
+    def exportar(self):
+        lineas = [
+            "# HELP http_request_duration_seconds Latencia por endpoint",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        with self.lock:
+            for endpoint, hist in sorted(self.latencias.items()):
+                for limite, conteo in zip(BUCKETS, hist.conteos):
+                    lineas.append(
+                        'http_request_duration_seconds_bucket{endpoint="%s",'
+                        'le="%s"} %d' % (endpoint, limite, conteo))
+                lineas.append(
+                    'http_request_duration_seconds_bucket{endpoint="%s",'
+                    'le="+Inf"} %d' % (endpoint, hist.total))
+                lineas.append('http_request_duration_seconds_sum'
+                              '{endpoint="%s"} %f' % (endpoint, hist.suma))
+                lineas.append('http_request_duration_seconds_count'
+                              '{endpoint="%s"} %d' % (endpoint, hist.total))
+            lineas.append("# HELP db_queries_total Consultas SQL por endpoint")
+            lineas.append("# TYPE db_queries_total counter")
+            for endpoint, total in sorted(self.consultas.items()):
+                lineas.append('db_queries_total{endpoint="%s"} %d'
+                              % (endpoint, total))
+            lineas.append("# HELP db_time_seconds_total Tiempo en la BD "
+                          "por endpoint")
+            lineas.append("# TYPE db_time_seconds_total counter")
+            for endpoint, total in sorted(self.tiempo_db.items()):
+                lineas.append('db_time_seconds_total{endpoint="%s"} %f'
+                              % (endpoint, total))
+            lineas.append("# HELP db_slow_query_seconds Consultas mas lentas")
+            lineas.append("# TYPE db_slow_query_seconds gauge")
+            for duracion, statement in sorted(self.lentas, reverse=True):
+                lineas.append('db_slow_query_seconds{statement="%s"} %f'
+                              % (escapar_etiqueta(statement), duracion))
+        return Response("\n".join(lineas) + "\n",
+                        mimetype="text/plain; version=0.0.4")
+
+
+def escapar_etiqueta(valor):
+    valor = " ".join(valor.split())
+    return valor.replace("\\", "\\\\").replace('"', '\\"')
@@ -0,0 +1,44 @@
+"""indices para busqueda de pacientes
+
+Revision ID: 4b1e7d3a9c20
+Revises: c2cf494d67b8
+Create Date: 2026-10-18 10:12:31.482913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b1e7d3a9c20'
+down_revision = 'c2cf494d67b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_paciente_residencia', 'paciente', ['residencia'])
+    op.create_index('ix_paciente_usuario', 'paciente', ['usuario'])
+    op.create_index('ix_personal_residencia', 'personal', ['residencia'])
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.execute('CREATE EXTENSION IF NOT EXISTS unaccent')
+        # unaccent() no es IMMUTABLE, hace falta envolverla para indexarla
+        op.execute(
+            "CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text AS "
+            "$$ SELECT public.unaccent('public.unaccent', $1) $$ "
+            "LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT"
+        )
+        op.execute(
+            "CREATE INDEX ix_paciente_nombre_trgm ON paciente USING gin "
+            "(f_unaccent(lower(nombre || ' ' || apellido)) gin_trgm_ops)"
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_paciente_nombre_trgm')
+        op.execute('DROP FUNCTION IF EXISTS f_unaccent(text)')
+    op.drop_index('ix_personal_residencia', table_name='personal')
+    op.drop_index('ix_paciente_usuario', table_name='paciente')
+    op.drop_index('ix_paciente_residencia', table_name='paciente')
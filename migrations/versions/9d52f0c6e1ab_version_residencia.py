@@ -0,0 +1,25 @@
+"""version por residencia para ETag de listados
+
+Revision ID: 9d52f0c6e1ab
+Revises: 4b1e7d3a9c20
+Create Date: 2026-10-18 11:04:57.120384
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d52f0c6e1ab'
+down_revision = '4b1e7d3a9c20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('residencia', sa.Column('version', sa.Integer(),
+                                          nullable=False, server_default='0'))
+
+
+def downgrade():
+    op.drop_column('residencia', 'version')
@@ -0,0 +1,30 @@
+"""borrar un usuario deja a su paciente sin cuenta
+
+Revision ID: e83a1f5b7d42
+Revises: 9d52f0c6e1ab
+Create Date: 2026-10-18 12:41:09.315207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e83a1f5b7d42'
+down_revision = '9d52f0c6e1ab'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('paciente') as batch_op:
+        batch_op.drop_constraint('paciente_usuario_fkey', type_='foreignkey')
+        batch_op.create_foreign_key('paciente_usuario_fkey', 'usuario',
+                                    ['usuario'], ['user'], ondelete='SET NULL')
+
+
+def downgrade():
+    with op.batch_alter_table('paciente') as batch_op:
+        batch_op.drop_constraint('paciente_usuario_fkey', type_='foreignkey')
+        batch_op.create_foreign_key('paciente_usuario_fkey', 'usuario',
+                                    ['usuario'], ['user'])
@@ -0,0 +1,114 @@
+import hashlib
+import math
+import random
+import time
+from contextlib import contextmanager
+
+from flask import has_request_context, request, session
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import event, orm
+
+from cache import CacheDiferida
+
+METODOS_LECTURA = ("GET", "HEAD")
+
+
+def clave_cliente():
+    """Quien hace el request, para lee-tus-escrituras sin depender de la
+    cookie: el token de la API o el usuario de la sesion."""
+    cabecera = request.headers.get("Authorization", "")
+    if cabecera.startswith("Bearer "):
+        return "token:" + hashlib.sha1(cabecera.encode("utf-8")).hexdigest()
+    usuario = session.get("_user_id")
+    if usuario is not None:
+        return "usuario:%s" % usuario
+    return None
+
+
+@contextmanager
+def en_principal(sesion):
+    """Las lecturas de adentro van a la principal aunque el request sea
+    GET (por ejemplo las versiones con las que se valida una cache)."""
+    anterior = sesion.info.get("principal", False)
+    sesion.info["principal"] = True
+    try:
+        yield sesion
+    finally:
+        sesion.info["principal"] = anterior
+
+
+class SesionReplicas(SignallingSession):
+    """Manda los SELECT de los requests de lectura a una replica.
+
+    Todo lo demas (escrituras, flush, requests POST/PUT/DELETE y los GET
+    de un cliente que acaba de escribir) va a la BD principal.
+    """
+
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        if self._flushing or not getattr(clause, "is_select", False):
+            if clause is not None or self._flushing:
+                self.info["escribio"] = True
+        elif self.usar_replica():
+            replica = self.info.get("replica")
+            if replica is None:
+                replica = random.choice(self.app.config["REPLICAS"])
+                self.info["replica"] = replica
+            return self.db.get_engine(self.app, bind=replica)
+        return super().get_bind(mapper, clause)
+
+    def usar_replica(self):
+        if (not self.app.config["REPLICAS"] or self.info.get("escribio")
+                or self.info.get("principal")):
+            return False
+        if not has_request_context() or request.method not in METODOS_LECTURA:
+            return False
+        # Lee-tus-escrituras: tras un commit el cliente sigue en la
+        # principal hasta que la replica tenga tiempo de alcanzarla. La
+        # cookie cubre a los navegadores; los clientes con token (o con
+        # sesion en otro dispositivo) se reconocen por el token o usuario
+        ahora = time.time()
+        if session.get("principal_hasta", 0) >= ahora:
+            return False
+        clave = clave_cliente()
+        return clave is None or self.db.escrituras.get(clave, 0) < ahora
+
+
+def marcar_escritura(sesion):
+    if sesion.info.pop("escribio", False) and has_request_context():
+        hasta = time.time() + sesion.app.config["REPLICA_VENTANA_ESCRITURA"]
+        session["principal_hasta"] = hasta
+        clave = clave_cliente()
+        if clave is not None:
+            sesion.db.escrituras.set(clave, hasta)
+
+
+def descartar_escritura(sesion):
+    sesion.info.pop("escribio", None)
+
+
+class SQLAlchemyReplicas(SQLAlchemy):
+    def __init__(self, *args, **kwargs):
+        # Hasta cuando lee de la principal cada token/usuario que escribio;
+        # con REPLICA_ESCRITURAS_URL (Redis) se comparte entre workers
+        self.escrituras = CacheDiferida(prefijo="principal:")
+        super().__init__(*args, **kwargs)
+
+    def init_app(self, app):
+        app.config.setdefault("REPLICAS", [])
+        app.config.setdefault("REPLICA_VENTANA_ESCRITURA", 5)
+        app.config.setdefault("REPLICA_ESCRITURAS_URL",
+                              app.config.get("USUARIO_CACHE_URL"))
+        self.escrituras.configurar(
+            app.config["REPLICA_ESCRITURAS_URL"],
+            ttl=math.ceil(app.config["REPLICA_VENTANA_ESCRITURA"]) + 1)
+        super().init_app(app)
+
+    def create_session(self, options):
+        fabrica = orm.sessionmaker(class_=SesionReplicas, db=self, **options)
+        event.listen(fabrica, "after_commit", marcar_escritura)
+        event.listen(fabrica, "after_rollback", descartar_escritura)
+        return fabrica
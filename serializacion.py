@@ -0,0 +1,127 @@
+import json
+from decimal import Decimal
+from itertools import repeat
+
+from flask import current_app
+from markupsafe import Markup
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Implementacion en C del json de la stdlib para escapar strings
+codificar_texto = json.encoder.encode_basestring_ascii
+
+
+def por_defecto(valor):
+    if isinstance(valor, Decimal):
+        return str(valor)
+    raise TypeError("%r no es serializable a JSON" % (valor,))
+
+
+class SerializadorJSON:
+    """JSON compacto y con claves ordenadas, como jsonify.
+
+    Usa orjson si esta instalado y si no el json de la stdlib; con
+    `usar_orjson=False` se fuerza la stdlib.
+    """
+
+    def __init__(self, usar_orjson=None):
+        if usar_orjson is None:
+            usar_orjson = orjson is not None
+        self.usar_orjson = usar_orjson and orjson is not None
+
+    def dumps(self, datos):
+        if self.usar_orjson:
+            return orjson.dumps(datos, default=por_defecto,
+                                option=orjson.OPT_SORT_KEYS
+                                | orjson.OPT_NON_STR_KEYS)
+        return json.dumps(datos, default=por_defecto, sort_keys=True,
+                          separators=(",", ":")).encode("utf-8")
+
+    def valor(self, valor):
+        # Los tipos de las columnas del listado van sin pasar por dumps
+        tipo = valor.__class__
+        if tipo is str:
+            return codificar_texto(valor)
+        if tipo is int:
+            return int.__repr__(valor)
+        if valor is None:
+            return "null"
+        if tipo is bool:
+            return "true" if valor else "false"
+        return self.dumps(valor).decode("utf-8")
+
+    def filas(self, columnas):
+        return FilasJSON(columnas, self)
+
+
+class FilasJSON:
+    """Escribe filas (tuplas) como una lista de objetos JSON.
+
+    Con orjson los objetos se arman en C (map de dict(zip(...))), sin
+    codigo Python por fila; con la stdlib las claves se ordenan una vez y
+    cada fila llena una plantilla, sin dicts intermedios.
+    """
+
+    def __init__(self, columnas, serializador):
+        self.columnas = tuple(columnas)
+        self.usar_orjson = serializador.usar_orjson
+        orden = sorted(range(len(columnas)), key=columnas.__getitem__)
+        self.plantilla = "{{%s}}" % ",".join(
+            codificar_texto(columnas[i]).replace("{", "{{").replace("}", "}}")
+            + ":{%d}" % i for i in orden)
+        self.valor = serializador.valor
+
+    def lote(self, filas):
+        """Los objetos separados por comas, sin los corchetes."""
+        if self.usar_orjson:
+            return orjson.dumps(
+                list(map(dict, map(zip, repeat(self.columnas), filas))),
+                default=por_defecto, option=orjson.OPT_SORT_KEYS)[1:-1]
+        formato = self.plantilla.format
+        valor = self.valor
+        return ",".join([formato(*map(valor, fila))
+                         for fila in filas]).encode("ascii")
+
+    def lista(self, filas):
+        return b"[" + self.lote(filas) + b"]"
+
+
+def json_html(datos):
+    """JSON ya serializado listo para un <script>, escapado igual que el
+    filtro tojson de Jinja."""
+    return Markup(datos.decode("utf-8")
+                  .replace("<", "\\u003c")
+                  .replace(">", "\\u003e")
+                  .replace("&", "\\u0026")
+                  .replace("'", "\\u0027"))
+
+
+class Serializacion:
+    def __init__(self, app=None):
+        self.serializador = SerializadorJSON()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("JSON_ORJSON", orjson is not None)
+        self.serializador = SerializadorJSON(app.config["JSON_ORJSON"])
+        app.extensions["serializacion"] = self
+
+
+def serializador():
+    return current_app.extensions["serializacion"].serializador
+
+
+def jsonify(*args, **kwargs):
+    """Reemplazo de flask.jsonify que usa el serializador de la app."""
+    if args and kwargs:
+        raise TypeError("jsonify() recibe argumentos o keywords, no ambos")
+    if len(args) == 1:
+        datos = args[0]
+    else:
+        datos = args or kwargs
+    return current_app.response_class(serializador().dumps(datos) + b"\n",
+                                      mimetype="application/json")
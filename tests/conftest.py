@@ -0,0 +1,93 @@
+import os
+import sys
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# TEST_DATABASE_URL permite correr la suite contra un PostgreSQL local
+os.environ["DATABASE_URL"] = os.environ.get("TEST_DATABASE_URL", "sqlite://")
+
+from app import (  # noqa: E402
+    create_app,
+    db,
+    limites_login,
+    Paciente,
+    PersonalMedico,
+)
+import generar_datos  # noqa: E402
+
+RESIDENCIAS = 5
+PERSONAL = 50
+PACIENTES = 2000
+
+
+@pytest.fixture(scope="session")
+def app():
+    # Los benchmarks hacen miles de logins seguidos desde la misma IP;
+    # tests/test_limites.py prueba los limites reales
+    flask_app = create_app({
+        "TESTING": True,
+        "LOGIN_CAPACIDAD_USUARIO": 10 ** 9,
+        "LOGIN_CAPACIDAD_IP": 10 ** 9,
+    })
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        generar_datos.generar(RESIDENCIAS, PERSONAL, PACIENTES, seed=1)
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture(autouse=True)
+def limpiar_limites():
+    yield
+    limites_login.limpiar()
+
+
+@pytest.fixture
+def login(client):
+    response = client.post(
+        "/api/login", json={"user": "personal0", "password": "1234"})
+    assert response.get_json()["message"] == "Correcto inicio de sesion"
+    # Deja el usuario en la cache de load_user para que los presupuestos
+    # midan solo la ruta
+    client.get("/registro_paciente")
+    return client
+
+
+@pytest.fixture
+def paciente(app):
+    return db.session.query(
+        Paciente.dni, Paciente.residencia, Paciente.habitacion).order_by(
+        Paciente.dni).first()
+
+
+@pytest.fixture
+def personal(app):
+    return PersonalMedico.query.order_by(PersonalMedico.dni).first()
+
+
+@pytest.fixture
+def contar_consultas(app):
+    @contextmanager
+    def contar():
+        consultas = []
+
+        def registrar(conn, cursor, statement, *args):
+            consultas.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", registrar)
+        try:
+            yield consultas
+        finally:
+            event.remove(db.engine, "before_cursor_execute", registrar)
+
+    return contar
@@ -0,0 +1,211 @@
+import asyncio
+import gzip
+import json
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+
+pytest.importorskip("aiosqlite")
+
+import asgi  # noqa: E402
+from app import Paciente, Residencia, Usuario, censo, db, indice_pacientes  # noqa: E402
+
+
+@pytest.fixture
+def motor(app, tmp_path):
+    # La API async necesita su propia BD: la de las demas pruebas vive en
+    # memoria dentro del engine sincrono
+    ruta = tmp_path / "asgi.db"
+    engine = create_engine("sqlite:///%s" % ruta)
+    db.Model.metadata.create_all(engine)
+    with engine.begin() as conexion:
+        conexion.execute(Residencia.__table__.insert(), [
+            {"id": id, "nombre": "R%d" % id, "direccion": "D",
+             "no_habitaciones": 10, "director": "X"} for id in (1, 2)])
+        conexion.execute(Usuario.__table__.insert(), [
+            {"user": "asgi0", "password": "1234", "es_admin": True}])
+        conexion.execute(Paciente.__table__.insert(), [
+            {"dni": 30000000 + i, "nombre": "N%d" % i, "apellido": "A",
+             "edad": 80, "habitacion": i % 5 + 1, "residencia": i % 2 + 1}
+            for i in range(30)])
+    engine.dispose()
+    censo.invalidar()
+    asgi.motor = asgi.create_async_engine(
+        "sqlite+aiosqlite:///%s" % ruta, poolclass=NullPool)
+    yield asgi.motor
+    asgi.motor = None
+    censo.invalidar()
+    indice_pacientes.invalidar()
+
+
+async def pedir(metodo, ruta, datos=None, cabeceras=()):
+    ruta, _, query = ruta.partition("?")
+    cuerpo = json.dumps(datos).encode() if datos is not None else b""
+    scope = {"type": "http", "method": metodo, "path": ruta,
+             "query_string": query.encode(), "headers": list(cabeceras)}
+    enviados = []
+
+    async def receive():
+        return {"type": "http.request", "body": cuerpo, "more_body": False}
+
+    async def send(mensaje):
+        enviados.append(mensaje)
+
+    await asgi.aplicacion(scope, receive, send)
+    inicio = enviados[0]
+    cuerpo = b"".join(m.get("body", b"") for m in enviados[1:])
+    return inicio["status"], dict(inicio["headers"]), cuerpo
+
+
+def llamar(*args, **kwargs):
+    estado, cabeceras, cuerpo = asyncio.run(pedir(*args, **kwargs))
+    return estado, cabeceras, json.loads(cuerpo) if cuerpo else None
+
+
+@pytest.fixture
+def token(motor):
+    _, _, datos = llamar("POST", "/api/login",
+                         {"user": "asgi0", "password": "1234"})
+    return [(b"authorization", ("Bearer %s" % datos["token"]).encode())]
+
+
+def test_login(motor):
+    estado, _, datos = llamar("POST", "/api/login",
+                              {"user": "asgi0", "password": "1234"})
+    assert datos["message"] == "Correcto inicio de sesion"
+    assert datos["token"]
+    assert llamar("POST", "/api/login", {"user": "asgi0", "password": "x"})[
+        2]["message"] == "Contraseña incorrecta"
+
+
+def test_ver_pacientes_pagina_y_stream(motor):
+    _, cabeceras, pagina = llamar("GET", "/api/ver_pacientes?limit=10")
+    assert len(pagina["pacientes"]) == 10
+    assert pagina["siguiente"] == 30000009
+    _, _, todos = llamar("GET", "/api/ver_pacientes?residencia=2")
+    assert len(todos) == 15
+    assert {p["residencia"] for p in todos} == {"R2"}
+    estado, _, _ = llamar("GET", "/api/ver_pacientes?limit=10", cabeceras=[
+        (b"if-none-match", cabeceras[b"etag"])])
+    assert estado == 304
+
+
+def test_registrar_y_editar_paciente(token):
+    _, _, datos = llamar("POST", "/api/pacientes/30000100/registrar", {
+        "nombre": "Async", "apellido": "Alta", "edad": 90,
+        "habitacion": "auto", "residencia_id": 1}, token)
+    assert datos["error"] is False
+    # Las habitaciones 1..5 de la residencia 1 ya estan ocupadas
+    assert datos["habitacion"] == 6
+    _, _, datos = llamar("POST", "/api/registro_paciente", {
+        "dni": 30000101, "nombre": "Async", "apellido": "Otra", "edad": 90,
+        "habitacion": "auto", "residencia": 1}, token)
+    assert datos["habitacion"] == 7
+    assert not censo.resumenes[1].reservadas
+    _, _, datos = llamar("POST", "/api/registro_paciente", {
+        "dni": 30000102, "nombre": "Async", "apellido": "Fuera", "edad": 90,
+        "habitacion": 11, "residencia": 1}, token)
+    assert datos == {"message": "Habitacion no existe en la residencia"}
+
+    def editar(habitacion):
+        return llamar("POST", "/api/pacientes/30000100/editar", {
+            "dni": 30000100, "nombre": "Async", "apellido": "Editado",
+            "edad": 91, "habitacion": habitacion, "residencia_id": 2},
+            token)[2]
+
+    assert editar(2) == {"category": "error", "error": False,
+                         "message": "Habitacion ocupada"}
+    assert editar(8) == {"error": False,
+                         "message": "Paciente editado correctamente"}
+    assert not censo.resumenes[2].reservadas
+    _, _, datos = llamar("POST", "/api/registro_paciente", {
+        "dni": 30000100, "nombre": "Otra", "apellido": "Vez", "edad": 70,
+        "habitacion": 1, "residencia": 1}, token)
+    assert datos["message"] == "Persona con este DNI ya ha sido registrada"
+
+
+def test_escrituras_requieren_token(motor):
+    estado, _, datos = llamar("POST", "/api/pacientes/30000100/registrar", {
+        "nombre": "Sin", "apellido": "Token", "edad": 90,
+        "habitacion": "auto", "residencia_id": 1})
+    assert estado == 401
+    assert datos == {"error": True, "message": "No autorizado"}
+    estado, _, _ = llamar("POST", "/api/registro_paciente", {
+        "dni": 30000100, "nombre": "Sin", "apellido": "Token", "edad": 90,
+        "habitacion": "auto", "residencia": 1},
+        [(b"authorization", b"Bearer falso")])
+    assert estado == 401
+
+
+def test_registrar_usuario(motor):
+    _, _, datos = llamar("POST", "/api/usuarios/familiar/registrar", {
+        "user": "familiar", "password": "1", "es_admin": "0",
+        "dni": "30000001"})
+    assert datos["message"] == "Usuario creado"
+    _, _, datos = llamar("POST", "/api/usuarios/otro/registrar", {
+        "user": "otro", "password": "1", "es_admin": "0",
+        "dni": "30000001"})
+    assert datos["message"] == "Paciente ya registrado"
+
+
+def test_error_devuelve_500(motor):
+    estado, _, datos = llamar("POST", "/api/login", {"user": "asgi0"})
+    assert estado == 500
+    assert datos == {"error": True, "message": "Error en el BE"}
+
+
+def test_peticiones_concurrentes(motor):
+    async def muchas():
+        entrada = asyncio.Queue()
+        salida = asyncio.Queue()
+        ciclo = asyncio.ensure_future(
+            asgi.aplicacion({"type": "lifespan"}, entrada.get, salida.put))
+        await entrada.put({"type": "lifespan.startup"})
+        assert (await salida.get())["type"] == "lifespan.startup.complete"
+        # El arranque deja el dialecto inicializado antes de la rafaga
+        assert motor.preparado
+        respuestas = await asyncio.wait_for(asyncio.gather(*[
+            pedir("GET", "/api/ver_pacientes?limit=5&after=%d" % (30000000 + i))
+            for i in range(200)]), timeout=60)
+        await entrada.put({"type": "lifespan.shutdown"})
+        await asyncio.wait_for(ciclo, timeout=10)
+        assert (await salida.get())["type"] == "lifespan.shutdown.complete"
+        return respuestas
+
+    respuestas = asyncio.run(muchas())
+    assert all(estado == 200 for estado, _, _ in respuestas)
+
+
+def test_peticiones_concurrentes_sin_arranque(motor):
+    async def muchas():
+        return await asyncio.wait_for(asyncio.gather(*[
+            pedir("GET", "/api/ver_pacientes?limit=5") for i in range(50)]),
+            timeout=60)
+
+    respuestas = asyncio.run(muchas())
+    assert all(estado == 200 for estado, _, _ in respuestas)
+
+
+def test_ver_pacientes_comprimido(motor):
+    _, _, plano = asyncio.run(pedir("GET", "/api/ver_pacientes"))
+    _, cabeceras, cuerpo = asyncio.run(pedir(
+        "GET", "/api/ver_pacientes", cabeceras=[(b"accept-encoding", b"gzip")]))
+    assert cabeceras[b"content-encoding"] == b"gzip"
+    assert cabeceras[b"etag"].startswith(b'W/"')
+    assert gzip.decompress(cuerpo) == plano
+
+
+def test_login_limitado(motor):
+    from app import limites_login
+
+    anteriores = limites_login.usuario
+    limites_login.usuario = (1, 1 / 60)
+    try:
+        datos = {"user": "asgi0", "password": "x"}
+        assert llamar("POST", "/api/login", datos)[0] == 200
+        estado, cabeceras, datos = llamar("POST", "/api/login", datos)
+        assert estado == 429
+        assert cabeceras[b"retry-after"] == b"60"
+    finally:
+        limites_login.usuario = anteriores
@@ -0,0 +1,27 @@
+from bench.carga import DNI_MAXIMO, percentil, rango_dnis, resumen
+
+
+def test_percentil():
+    valores = list(range(1, 101))
+    assert percentil(valores, 50) == 50
+    assert percentil(valores, 95) == 95
+    assert percentil(valores, 99) == 99
+    assert percentil([], 50) is None
+
+
+def test_resumen():
+    muestras = [(0.010, True), (0.020, True), (0.030, False), (0.040, True)]
+    datos = resumen(muestras, 2.0)
+    assert datos["peticiones"] == 4
+    assert datos["errores"] == 1
+    assert datos["tasa_error"] == 0.25
+    assert datos["throughput"] == 2.0
+    assert datos["p50_ms"] == 20.0
+
+
+def test_rango_dnis():
+    rangos = [rango_dnis(numero, 501) for numero in range(501)]
+    assert all(desde < hasta for desde, hasta in rangos)
+    assert all(a[1] <= b[0] for a, b in zip(rangos, rangos[1:]))
+    assert rangos[-1][1] - 1 <= DNI_MAXIMO
+    assert all(len(str(desde)) == 8 for desde, hasta in rangos)
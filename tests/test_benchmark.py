@@ -0,0 +1,51 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+
+@pytest.mark.parametrize("url", [
+    "/",
+    "/login",
+    "/registro_usuario",
+    "/api/ver_pacientes?limit=100",
+    "/api/ver_pacientes?limit=1000",
+    "/api/ver_pacientes",
+    "/metrics",
+])
+def test_benchmark_get(benchmark, client, url):
+    response = benchmark(client.get, url)
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("url", [
+    "/pacientes",
+    "/pacientes?limit=1000",
+])
+def test_benchmark_get_login(benchmark, login, url):
+    response = benchmark(login.get, url)
+    assert response.status_code == 200
+
+
+def test_benchmark_editar_paciente_form(benchmark, login, paciente):
+    response = benchmark(login.get, "/editar-paciente/%d" % paciente.dni)
+    assert response.status_code == 200
+
+
+def test_benchmark_api_login(benchmark, client):
+    response = benchmark(client.post, "/api/login",
+                         json={"user": "personal2", "password": "1234"})
+    assert response.status_code == 200
+
+
+def test_benchmark_api_editar_paciente(benchmark, login, paciente):
+    datos = {
+        "dni": paciente.dni,
+        "nombre": "Bench",
+        "apellido": "Mark",
+        "edad": 82,
+        "habitacion": paciente.habitacion,
+        "residencia_id": paciente.residencia,
+    }
+    response = benchmark(login.post,
+                         "/api/pacientes/%d/editar" % paciente.dni, json=datos)
+    assert response.get_json()["error"] is False
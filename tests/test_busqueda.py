@@ -0,0 +1,67 @@
+from app import Paciente, db
+from busqueda import IndiceNgramas, rango_dni, trigramas
+
+
+def test_trigramas_sin_acentos():
+    assert trigramas("Ramírez") == trigramas("RAMIREZ")
+
+
+def test_rango_dni():
+    assert rango_dni("1234") == (12340000, 12349999)
+    assert rango_dni("12345678") == (12345678, 12345678)
+
+
+def test_indice_ngramas():
+    filas = [
+        (10000001, "José", "Gutiérrez", 1),
+        (10000002, "Ana", "Quispe", 1),
+        (10000003, "José", "Gutierrez", 2),
+    ]
+    indice = IndiceNgramas(lambda: filas)
+    assert indice.buscar("gutieres") == [10000001, 10000003]
+    assert indice.buscar("jose gutierrez", residencia=2) == [10000003]
+    indice.actualizar(10000002, "Ana", "Gutierrez", 1)
+    assert 10000002 in indice.buscar("gutierrez")
+    indice.quitar(10000001)
+    assert 10000001 not in indice.buscar("gutierrez")
+
+
+def test_api_buscar_por_dni(client, paciente):
+    prefijo = str(paciente.dni)[:5]
+    data = client.get("/api/pacientes/search?q=" + prefijo).get_json()
+    assert data["pacientes"]
+    assert all(str(p["dni"]).startswith(prefijo) for p in data["pacientes"])
+
+
+def test_api_buscar_por_nombre(client, contar_consultas):
+    db.session.add(Paciente(dni=11130001, nombre="Zoila", apellido="Ñahuí",
+                            edad=90, habitacion=1, residencia=2))
+    db.session.commit()
+    with contar_consultas() as consultas:
+        data = client.get("/api/pacientes/search?q=zoila nahui").get_json()
+    assert [p["dni"] for p in data["pacientes"]] == [11130001]
+    assert len(consultas) <= 2
+    data = client.get(
+        "/api/pacientes/search?q=zoila nahui&residencia=1").get_json()
+    assert data["pacientes"] == []
+
+
+def test_buscar_despues_de_registrar(login):
+    # Con el indice ya construido, las altas llegan por los eventos con el
+    # dni y la residencia como texto (tal como vienen en la URL y el JSON)
+    login.get("/api/pacientes/search?q=gutierrez")
+    for ruta, dni, nombre in (
+            ("/api/pacientes/%d/registrar", 11130002, "Eustaquio"),
+            ("/pacientes/%d/registrar", 11130003, "Eleuterio")):
+        response = login.post(ruta % dni, json={
+            "nombre": nombre,
+            "apellido": "Buscable",
+            "edad": 80,
+            "habitacion": "auto",
+            "residencia_id": "3",
+        })
+        assert response.get_json()["error"] is False
+        for url in ("/api/pacientes/search?q=%s buscable" % nombre,
+                    "/api/pacientes/search?q=%s&residencia=3" % nombre):
+            data = login.get(url).get_json()
+            assert [p["dni"] for p in data["pacientes"]] == [dni]
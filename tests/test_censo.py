@@ -0,0 +1,167 @@
+from app import Residencia, censo, db, reconstruir_resumen
+from censo import rango_edad
+
+
+def resumen(client, residencia):
+    return client.get("/api/residencias/%d/resumen" % residencia).get_json()
+
+
+def test_rango_edad():
+    assert rango_edad(40) == "<65"
+    assert rango_edad(65) == "65-74"
+    assert rango_edad(94) == "85-94"
+    assert rango_edad(101) == "95+"
+
+
+def test_resumen_cacheado(client, contar_consultas):
+    resumen(client, 3)
+    with contar_consultas() as consultas:
+        datos = resumen(client, 3)
+    assert len(consultas) == 1
+    assert datos["pacientes"] > 0
+    assert datos["personal"]["total"] > 0
+    assert sum(datos["edades"].values()) == datos["pacientes"]
+
+
+def test_resumen_incremental(login, contar_consultas):
+    client = login
+    antes_3 = resumen(client, 3)
+    antes_5 = resumen(client, 5)
+    client.post("/api/pacientes/11160001/registrar", json={
+        "nombre": "Censo",
+        "apellido": "Prueba",
+        "edad": 96,
+        "habitacion": "auto",
+        "residencia_id": 3,
+    })
+    response = client.post("/api/pacientes/11160001/editar", json={
+        "dni": 11160001,
+        "nombre": "Censo",
+        "apellido": "Prueba",
+        "edad": 70,
+        "habitacion": "auto",
+        "residencia_id": 5,
+    })
+    assert response.get_json()["message"] == "Paciente editado correctamente"
+    with contar_consultas() as consultas:
+        despues_3 = resumen(client, 3)
+        despues_5 = resumen(client, 5)
+    # Los deltas propios se aplican sin reconstruir
+    assert len(consultas) == 2
+    assert despues_3 == antes_3
+    assert despues_5["pacientes"] == antes_5["pacientes"] + 1
+    assert despues_5["edades"]["65-74"] == antes_5["edades"]["65-74"] + 1
+    assert despues_5 == reconstruir_resumen(5).a_dict()
+
+
+def test_resumen_reconstruido_si_cambia_version(login):
+    client = login
+    resumen(client, 5)
+    client.post("/api/pacientes/bulk", data=(
+        '{"dni": 11160002, "nombre": "A", "apellido": "B", "edad": 80, '
+        '"habitacion": 1, "residencia": 5}'),
+        content_type="application/x-ndjson")
+    assert resumen(client, 5) == reconstruir_resumen(5).a_dict()
+    assert censo.resumenes[5].version == reconstruir_resumen(5).version
+
+
+def test_resumen_residencia_inexistente(client):
+    assert client.get("/api/residencias/999/resumen").status_code == 404
+
+
+def test_habitaciones_libres_y_asignacion(app, login):
+    client = login
+    from app import Residencia, db
+
+    residencia = Residencia(id=50, nombre="Pequeña", direccion="Lince",
+                            no_habitaciones=3, director="X")
+    db.session.add(residencia)
+    db.session.commit()
+    datos = client.get("/api/residencias/50/habitaciones/libres").get_json()
+    assert datos["libres"] == [1, 2, 3]
+    for dni, esperada in ((11170001, 1), (11170002, 2)):
+        response = client.post("/api/pacientes/%d/registrar" % dni, json={
+            "nombre": "Auto",
+            "apellido": "Asignado",
+            "edad": 80,
+            "habitacion": "auto",
+            "residencia_id": 50,
+        })
+        assert response.get_json()["habitacion"] == esperada
+    datos = client.get("/api/residencias/50/habitaciones/libres").get_json()
+    assert datos == {"residencia": 50, "total": 1, "libres": [3]}
+    client.post("/api/pacientes/11170003/registrar", json={
+        "nombre": "Manual",
+        "apellido": "Asignado",
+        "edad": 80,
+        "habitacion": 3,
+        "residencia_id": 50,
+    })
+    response = client.post("/api/pacientes/11170004/registrar", json={
+        "nombre": "Sin",
+        "apellido": "Lugar",
+        "edad": 80,
+        "residencia_id": 50,
+    })
+    assert response.get_json()["message"] == "No hay habitaciones libres"
+    client.delete("/pacientes/11170001/delete-paciente")
+    datos = client.get("/api/residencias/50/habitaciones/libres").get_json()
+    assert datos["libres"] == [1]
+
+
+def test_habitacion_explicita_validada(app, login):
+    with app.app_context():
+        db.session.add(Residencia(id=51, nombre="Chica", direccion="Calle 1",
+                                  no_habitaciones=2, director="Director"))
+        db.session.commit()
+
+    def registrar(dni, habitacion):
+        return login.post("/api/pacientes/%d/registrar" % dni, json={
+            "nombre": "Censo",
+            "apellido": "Habitacion",
+            "edad": 80,
+            "habitacion": habitacion,
+            "residencia_id": 51,
+        }).get_json()["message"]
+
+    def editar(dni, habitacion):
+        return login.post("/api/pacientes/%d/editar" % dni, json={
+            "dni": dni,
+            "nombre": "Censo",
+            "apellido": "Habitacion",
+            "edad": 80,
+            "habitacion": habitacion,
+            "residencia_id": 51,
+        }).get_json()["message"]
+
+    assert registrar(11190001, 0) == "Habitacion no existe en la residencia"
+    assert registrar(11190001, 3) == "Habitacion no existe en la residencia"
+    assert registrar(11190001, 1) == "Paciente registrado correctamente"
+    assert registrar(11190002, 1) == "Habitacion ocupada"
+    assert registrar(11190002, 2) == "Paciente registrado correctamente"
+    assert registrar(11190003, "auto") == "No hay habitaciones libres"
+    response = login.post("/api/registro_paciente", json={
+        "dni": "11190003", "nombre": "Censo", "apellido": "Habitacion",
+        "edad": 80, "habitacion": 2, "residencia": 51})
+    assert response.get_json()["message"] == "Habitacion ocupada"
+
+    assert editar(11190002, 1) == "Habitacion ocupada"
+    assert editar(11190002, 5) == "Habitacion no existe en la residencia"
+    # Quedarse en la propia habitacion siempre vale
+    assert editar(11190002, 2) == "Paciente editado correctamente"
+
+    response = login.patch("/api/pacientes/batch", json={
+        "cambios": [{"dni": 11190002, "habitacion": 1},
+                    {"dni": 11190001, "habitacion": 3},
+                    {"dni": 11190001, "edad": 81}]})
+    datos = response.get_json()
+    assert [r.get("message") for r in datos["resultados"]] == [
+        "Habitacion ocupada", "Habitacion no existe en la residencia", None]
+    assert datos["actualizados"] == 1
+
+    # Dos pacientes a la misma habitacion chocan entre si
+    response = login.patch("/api/pacientes/batch", json={
+        "filtro": {"residencia": 51}, "valores": {"habitacion": 2}})
+    assert response.status_code == 400
+    assert response.get_json()["message"] == (
+        "Paciente 11190001: Habitacion ocupada")
@@ -0,0 +1,69 @@
+import gzip
+
+import pytest
+
+from compresion import brotli, elegir_codificacion
+
+
+@pytest.mark.parametrize("cabecera,disponibles,esperado", [
+    (None, ("gzip",), None),
+    ("gzip, deflate", ("gzip",), "gzip"),
+    ("br;q=0.5, gzip", ("br", "gzip"), "gzip"),
+    ("br, gzip", ("br", "gzip"), "br"),
+    ("gzip;q=0", ("gzip",), None),
+    ("*", ("gzip",), "gzip"),
+    ("identity", ("br", "gzip"), None),
+])
+def test_elegir_codificacion(cabecera, disponibles, esperado):
+    assert elegir_codificacion(cabecera, disponibles) == esperado
+
+
+def test_listado_comprimido(client):
+    url = "/api/ver_pacientes?limit=500"
+    plano = client.get(url)
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert gzip.decompress(response.data) == plano.data
+    assert len(response.data) < len(plano.data)
+    # El ETag debil de la version comprimida tambien vale para el 304
+    etag = response.headers["ETag"]
+    assert etag.startswith("W/")
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_respuesta_chica_sin_comprimir(client):
+    response = client.get("/api/ver_pacientes?limit=1",
+                          headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+
+
+def test_stream_comprimido(client):
+    plano = client.get("/api/ver_pacientes").data
+    response = client.get("/api/ver_pacientes",
+                          headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.data) == plano
+
+
+@pytest.mark.skipif(brotli is None, reason="brotli no instalado")
+def test_listado_brotli(client):
+    url = "/api/ver_pacientes?limit=500"
+    response = client.get(url, headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["Content-Encoding"] == "br"
+    assert brotli.decompress(response.data) == client.get(url).data
+
+
+def test_asset_con_huella(app, login):
+    html = login.get("/").get_data(as_text=True)
+    with app.test_request_context():
+        url = app.extensions["estaticos"].url("logo.jpg")
+    assert url.startswith("/assets/logo.") and url in html
+    response = login.get(url)
+    assert response.status_code == 200
+    assert "immutable" in response.headers["Cache-Control"]
+    with open(app.static_folder + "/logo.jpg", "rb") as archivo:
+        assert response.data == archivo.read()
+    assert login.get(url, headers={
+        "If-None-Match": response.headers["ETag"]}).status_code == 304
+    assert login.get("/assets/logo.0000.jpg").status_code == 404
@@ -0,0 +1,451 @@
+import pytest
+
+from app import Paciente, Usuario, db
+
+# Maximo de sentencias SQL por request. Las escrituras de pacientes suman
+# el UPDATE de la version de la residencia (y en SQLite, que no tiene
+# RETURNING, un SELECT para leer la version nueva).
+
+
+def test_index(client, contar_consultas):
+    with contar_consultas() as consultas:
+        assert client.get("/").status_code == 200
+    assert len(consultas) == 0
+
+
+def test_login_get(client, contar_consultas):
+    with contar_consultas() as consultas:
+        assert client.get("/login").status_code == 200
+    assert len(consultas) == 0
+
+
+def test_login_post(client, contar_consultas):
+    with contar_consultas() as consultas:
+        response = client.post(
+            "/login", data={"user": "personal1", "password": "1234"})
+    assert response.status_code == 302
+    assert len(consultas) <= 1
+
+
+def test_logout(login, contar_consultas):
+    with contar_consultas() as consultas:
+        assert login.get("/logout").status_code == 302
+    assert len(consultas) == 0
+
+
+def test_api_login(client, contar_consultas):
+    with contar_consultas() as consultas:
+        response = client.post(
+            "/api/login", json={"user": "personal1", "password": "1234"})
+    assert response.get_json()["message"] == "Correcto inicio de sesion"
+    assert len(consultas) <= 1
+
+
+def test_registro_usuario(client, contar_consultas):
+    with contar_consultas() as consultas:
+        assert client.get("/registro_usuario").status_code == 200
+    assert len(consultas) == 0
+
+
+@pytest.mark.parametrize("limit", [10, 500])
+def test_ver_pacientes(login, contar_consultas, limit):
+    with contar_consultas() as consultas:
+        response = login.get("/pacientes?limit=%d" % limit)
+    assert response.status_code == 200
+    assert response.data.count(b"delete-button") >= limit
+    assert len(consultas) <= 3
+
+
+@pytest.mark.parametrize("limit", [10, 500])
+def test_api_ver_pacientes_pagina(client, contar_consultas, limit):
+    with contar_consultas() as consultas:
+        data = client.get("/api/ver_pacientes?limit=%d" % limit).get_json()
+    assert len(data["pacientes"]) == limit
+    assert len(consultas) <= 2
+
+
+def test_api_ver_pacientes_stream(client, contar_consultas):
+    with contar_consultas() as consultas:
+        data = client.get("/api/ver_pacientes").get_json()
+    assert len(data) >= 1000
+    assert len(consultas) <= 2
+
+
+def test_editar_paciente_form(login, contar_consultas, paciente):
+    with contar_consultas() as consultas:
+        response = login.get("/editar-paciente/%d" % paciente.dni)
+    assert response.status_code == 200
+    assert len(consultas) <= 1
+
+
+def test_editar_paciente(login, contar_consultas, paciente):
+    datos = {
+        "dni": paciente.dni,
+        "nombre": "Editado",
+        "apellido": "Web",
+        "edad": 80,
+        "habitacion": paciente.habitacion,
+        "residencia_id": paciente.residencia,
+    }
+    with contar_consultas() as consultas:
+        response = login.post("/pacientes/%d/editar" % paciente.dni,
+                              json=datos)
+    assert response.get_json()["message"] == "Paciente editado correctamente"
+    assert len(consultas) <= 5
+
+
+def test_api_editar_paciente(login, contar_consultas, paciente):
+    client = login
+    datos = {
+        "dni": paciente.dni,
+        "nombre": "Editado",
+        "apellido": "Api",
+        "edad": 81,
+        "habitacion": paciente.habitacion,
+        "residencia_id": paciente.residencia,
+    }
+    with contar_consultas() as consultas:
+        response = client.post("/api/pacientes/%d/editar" % paciente.dni,
+                               json=datos)
+    assert response.get_json()["message"] == "Paciente editado correctamente"
+    assert len(consultas) <= 5
+
+
+def nuevo_paciente(dni):
+    return {
+        "dni": str(dni),
+        "nombre": "Nuevo",
+        "apellido": "Paciente",
+        "edad": 75,
+        "habitacion": "auto",
+        "residencia": 1,
+        "residencia_id": 1,
+    }
+
+
+def test_registro_paciente(login, contar_consultas):
+    # La habitacion sale del censo, que queda en cache tras la primera vez
+    login.get("/api/residencias/1/resumen")
+    with contar_consultas() as consultas:
+        response = login.post("/registro_paciente",
+                              json=nuevo_paciente(11110001))
+    assert response.status_code == 200
+    assert len(consultas) <= 5
+
+
+def test_registrar_paciente_by_id(login, contar_consultas):
+    with contar_consultas() as consultas:
+        response = login.post("/pacientes/11110002/registrar",
+                              json=nuevo_paciente(11110002))
+    assert response.get_json()["error"] is False
+    assert len(consultas) <= 5
+
+
+def test_api_registro_paciente(login, contar_consultas):
+    client = login
+    with contar_consultas() as consultas:
+        response = client.post("/api/registro_paciente",
+                               json=nuevo_paciente(11110003))
+    assert response.get_json()["message"] == "Paciente registrado correctamente"
+    assert len(consultas) <= 5
+
+
+def test_api_registrar_paciente(login, contar_consultas):
+    client = login
+    with contar_consultas() as consultas:
+        response = client.post("/api/pacientes/11110004/registrar",
+                               json=nuevo_paciente(11110004))
+    assert response.get_json()["error"] is False
+    assert len(consultas) <= 5
+
+
+def test_api_importar_pacientes(login, contar_consultas):
+    client = login
+    filas = "\n".join(
+        '{"dni": %d, "nombre": "A", "apellido": "B", "edad": 70, '
+        '"habitacion": 1, "residencia": 1}' % (11200000 + i)
+        for i in range(1000))
+    with contar_consultas() as consultas:
+        response = client.post("/api/pacientes/bulk", data=filas,
+                               content_type="application/x-ndjson")
+    assert response.get_json()["insertados"] == 1000
+    assert len(consultas) <= 5
+
+
+def test_api_importar_pacientes_sin_login(client):
+    response = client.post("/api/pacientes/bulk", data=(
+        '{"dni": 11201000, "nombre": "A", "apellido": "B", "edad": 70, '
+        '"habitacion": 1, "residencia": 1}'),
+        content_type="application/x-ndjson")
+    assert response.status_code == 401
+
+
+def test_api_editar_pacientes_batch(app, login, contar_consultas):
+    client = login
+    with app.app_context():
+        dnis = [dni for (dni,) in db.session.query(Paciente.dni)
+                .order_by(Paciente.dni).limit(200)]
+        db.session.close()
+    cambios = [{"dni": dni, "edad": 90} for dni in dnis[:100]]
+    cambios += [{"dni": dni, "nombre": "Lote"} for dni in dnis[100:]]
+    cambios.append({"dni": 1, "edad": 90})
+    cambios.append({"dni": dnis[0], "clave": "x"})
+    with contar_consultas() as consultas:
+        response = client.patch("/api/pacientes/batch",
+                                json={"cambios": cambios})
+    datos = response.get_json()
+    assert datos["error"] is False
+    assert datos["actualizados"] == 200
+    assert [r["error"] for r in datos["resultados"][-2:]] == [True, True]
+    assert len(consultas) <= 8
+    with app.app_context():
+        assert db.session.get(Paciente, dnis[150]).nombre == "Lote"
+        db.session.close()
+
+
+def test_api_editar_pacientes_batch_sin_login(client):
+    response = client.patch("/api/pacientes/batch", json={
+        "filtro": {"residencia": 2}, "valores": {"edad": 99}})
+    assert response.status_code == 401
+
+
+def test_api_editar_pacientes_batch_filtro(app, login, contar_consultas):
+    client = login
+    filtro = {"residencia": 2, "habitacion_desde": 1, "habitacion_hasta": 5}
+    with contar_consultas() as consultas:
+        response = client.patch("/api/pacientes/batch", json={
+            "filtro": filtro, "valores": {"edad": 99}})
+    datos = response.get_json()
+    assert datos["error"] is False
+    assert len(consultas) <= 6
+    with app.app_context():
+        editados = db.session.query(Paciente).filter(
+            Paciente.residencia == 2, Paciente.habitacion <= 5).all()
+        assert len(editados) == datos["actualizados"]
+        assert all(p.edad == 99 for p in editados)
+        db.session.close()
+
+    response = client.patch("/api/pacientes/batch", json={
+        "filtro": {}, "valores": {"edad": 1}})
+    assert response.status_code == 400
+
+
+def registro_personal(usuario, dni):
+    return {
+        "user": usuario,
+        "password": "1234",
+        "es_admin": "1",
+        "dni": str(dni),
+        "nombre": "Nuevo",
+        "apellido": "Personal",
+        "titulo": "Doctor",
+        "especialidad": "Geriatria",
+        "residencia_id": 1,
+    }
+
+
+def test_registrar_usuario(client, contar_consultas):
+    with contar_consultas() as consultas:
+        response = client.post(
+            "/usuarios/nuevo1/registrar",
+            json=registro_personal("nuevo1", 11120001))
+    assert response.get_json()["message"] == "Usuario creado correctamente"
+    assert len(consultas) <= 5
+
+
+def test_api_registrar_usuario(client, contar_consultas):
+    with contar_consultas() as consultas:
+        response = client.post(
+            "/api/usuarios/nuevo2/registrar",
+            json=registro_personal("nuevo2", 11120002))
+    assert response.get_json()["message"] == "Usuario creado correctamente"
+    assert len(consultas) <= 5
+
+
+def test_registrar_usuario_repetido(client, contar_consultas):
+    with contar_consultas() as consultas:
+        response = client.post(
+            "/api/usuarios/personal1/registrar",
+            json=registro_personal("personal1", 11120003))
+    assert response.get_json()["message"] == "Usuario ya existe"
+    assert len(consultas) == 1
+
+
+def test_registrar_usuario_paciente(app, client, contar_consultas):
+    with app.app_context():
+        dni = db.session.query(Paciente.dni).filter(
+            Paciente.usuario.is_(None)).first()[0]
+        db.session.close()
+    datos = {"user": "familiar1", "password": "1234", "es_admin": "0",
+             "dni": str(dni)}
+    with contar_consultas() as consultas:
+        response = client.post("/usuarios/familiar1/registrar", json=datos)
+    assert response.get_json()["message"] == "Usuario creado"
+    assert len(consultas) <= 5
+    response = client.post("/usuarios/familiar2/registrar",
+                           json=dict(datos, user="familiar2"))
+    assert response.get_json()["message"] == "Paciente ya registrado"
+    with app.app_context():
+        assert db.session.get(Paciente, dni).usuario == "familiar1"
+        db.session.close()
+
+
+def test_delete_paciente(login, contar_consultas):
+    paciente = db.session.query(Paciente.dni).filter(
+        Paciente.usuario.isnot(None)).order_by(Paciente.dni.desc()).first()
+    with contar_consultas() as consultas:
+        response = login.delete("/pacientes/%d/delete-paciente" % paciente.dni)
+    assert response.get_json()["message"] == "Paciente eliminado con exito"
+    assert len(consultas) <= 8
+    assert Usuario.query.filter_by(user="personal0").count() == 1
+
+
+def test_api_eliminar_pacientes(app, login, contar_consultas):
+    client = login
+    with app.app_context():
+        filas = db.session.query(Paciente.dni, Paciente.usuario).order_by(
+            Paciente.dni.desc()).offset(10).limit(50).all()
+        db.session.close()
+    dnis = [dni for dni, usuario in filas]
+    cuentas = [usuario for dni, usuario in filas if usuario is not None]
+    assert cuentas
+    with contar_consultas() as consultas:
+        response = client.post("/api/pacientes/bulk-delete",
+                               json={"dnis": dnis + [1]})
+    datos = response.get_json()
+    assert datos["error"] is False
+    assert datos["eliminados"] == len(dnis)
+    assert len(consultas) <= 6
+    with app.app_context():
+        assert db.session.query(Paciente).filter(
+            Paciente.dni.in_(dnis)).count() == 0
+        assert db.session.query(Usuario).filter(
+            Usuario.user.in_(cuentas)).count() == 0
+        db.session.close()
+
+
+def test_api_eliminar_pacientes_solo_admin(app, client):
+    with app.app_context():
+        dni, usuario = db.session.query(Paciente.dni, Paciente.usuario).filter(
+            Paciente.usuario.isnot(None)).order_by(Paciente.dni).first()
+        db.session.close()
+    response = client.post("/api/pacientes/bulk-delete", json={"dnis": [dni]})
+    assert response.status_code == 401
+    token = client.post("/api/login", json={
+        "user": usuario, "password": "1234", "token": True,
+    }).get_json()["token"]
+    response = client.post("/api/pacientes/bulk-delete", json={"dnis": [dni]},
+                           headers={"Authorization": "Bearer " + token})
+    assert response.status_code == 403
+    with app.app_context():
+        assert db.session.get(Paciente, dni) is not None
+        db.session.close()
+
+
+def test_metrics(client, contar_consultas):
+    with contar_consultas() as consultas:
+        assert client.get("/metrics").status_code == 200
+    assert len(consultas) == 0
+
+
+def test_load_user_cacheado(login, contar_consultas):
+    login.get("/registro_paciente")
+    with contar_consultas() as consultas:
+        assert login.get("/registro_paciente").status_code == 200
+    assert len(consultas) == 0
+
+
+def test_load_user_sin_password(app):
+    from app import cache_usuarios, load_user
+
+    usuario = Usuario.query.filter_by(user="personal1").first()
+    db.session.close()
+    cache_usuarios.invalidar(usuario.id)
+    identidad = load_user(str(usuario.id))
+    assert cache_usuarios.get(usuario.id) == {
+        "id": usuario.id, "user": "personal1", "es_admin": True}
+    assert identidad.get_id() == str(usuario.id)
+    assert identidad.is_authenticated and identidad.es_admin
+    assert not hasattr(identidad, "password")
+    with pytest.raises(AttributeError):
+        identidad.es_admin = False
+
+
+def test_load_user_invalidado_al_borrar(app, client, contar_consultas):
+    from app import cache_usuarios
+
+    paciente = db.session.query(Paciente.dni, Paciente.usuario).filter(
+        Paciente.usuario.isnot(None)).order_by(Paciente.dni).first()
+    usuario = Usuario.query.filter_by(user=paciente.usuario).first()
+    client.post("/api/login",
+                json={"user": usuario.user, "password": "1234"})
+    assert client.get("/registro_paciente").status_code == 200
+    assert cache_usuarios.get(usuario.id) is not None
+    admin = app.test_client()
+    admin.post("/api/login", json={"user": "personal0", "password": "1234"})
+    admin.delete("/pacientes/%d/delete-paciente" % paciente.dni)
+    assert client.get("/registro_paciente").status_code == 302
+
+
+def test_token_api(client, contar_consultas):
+    token = client.post("/api/login", json={
+        "user": "personal3", "password": "1234", "token": True,
+    }).get_json()["token"]
+    otro = client.application.test_client()
+    with contar_consultas() as consultas:
+        response = otro.get(
+            "/registro_paciente",
+            headers={"Authorization": "Bearer " + token})
+    assert response.status_code == 200
+    assert len(consultas) == 0
+    response = otro.get(
+        "/registro_paciente",
+        headers={"Authorization": "Bearer " + token + "x"})
+    assert response.status_code == 302
+
+
+def test_token_api_escritura(client):
+    token = client.post("/api/login", json={
+        "user": "personal3", "password": "1234", "token": True,
+    }).get_json()["token"]
+    otro = client.application.test_client()
+    url = "/api/pacientes/11110005/registrar"
+    response = otro.post(url, json=nuevo_paciente(11110005))
+    assert response.status_code == 401
+    assert response.get_json() == {"error": True, "message": "No autorizado"}
+    response = otro.post(url, json=nuevo_paciente(11110005),
+                         headers={"Authorization": "Bearer " + token + "x"})
+    assert response.status_code == 401
+    response = otro.post(url, json=nuevo_paciente(11110005),
+                         headers={"Authorization": "Bearer " + token})
+    assert response.get_json()["error"] is False
+    assert db.session.get(Paciente, 11110005) is not None
+    db.session.close()
+
+
+def test_etag_api_ver_pacientes(login, contar_consultas, paciente):
+    client = login
+    url = "/api/ver_pacientes?limit=50&residencia=%d" % paciente.residencia
+    etag = client.get(url).headers["ETag"]
+    with contar_consultas() as consultas:
+        response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert len(consultas) == 1
+    client.post("/api/pacientes/11140001/registrar", json={
+        "nombre": "Otro",
+        "apellido": "Paciente",
+        "edad": 70,
+        "habitacion": "auto",
+        "residencia_id": paciente.residencia,
+    })
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_etag_ver_pacientes(login, contar_consultas):
+    etag = login.get("/pacientes").headers["ETag"]
+    with contar_consultas() as consultas:
+        response = login.get("/pacientes", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert len(consultas) == 1
@@ -0,0 +1,56 @@
+from app import PersonalMedico, db
+
+
+def personal_db(app, *filtros):
+    with app.app_context():
+        dnis = [dni for (dni,) in db.session.query(PersonalMedico.dni)
+                .filter(*filtros).order_by(PersonalMedico.dni)]
+        db.session.close()
+    return dnis
+
+
+def recorrer(client, consulta, limit):
+    dnis = []
+    after = ""
+    while True:
+        datos = client.get("/api/personal?limit=%d%s%s" % (
+            limit, consulta, after)).get_json()
+        dnis += [persona["dni"] for persona in datos["personal"]]
+        if datos["siguiente"] is None:
+            return dnis
+        after = "&after=%d" % datos["siguiente"]
+
+
+def test_personal_paginado(app, client):
+    assert recorrer(client, "", 7) == personal_db(app)
+    assert recorrer(client, "&titulo=Doctor", 3) == personal_db(
+        app, PersonalMedico.titulo == "Doctor")
+
+
+def test_personal_por_residencia_y_especialidad(app, client, contar_consultas):
+    client.get("/api/personal")
+    with contar_consultas() as consultas:
+        datos = client.get(
+            "/api/personal?residencia=1&especialidad=Geriatria").get_json()
+    assert len(consultas) == 0
+    assert [p["dni"] for p in datos["personal"]] == personal_db(
+        app, PersonalMedico.residencia == 1,
+        PersonalMedico.especialidad == "Geriatria")
+
+
+def test_personal_invalidado_al_registrar(client):
+    antes = client.get("/api/personal?residencia=2&limit=1000").get_json()
+    client.post("/api/usuarios/directorio1/registrar", json={
+        "user": "directorio1",
+        "password": "1234",
+        "es_admin": "1",
+        "dni": "11170001",
+        "nombre": "Nuevo",
+        "apellido": "Turno",
+        "titulo": "Enfermera",
+        "especialidad": "Geriatria",
+        "residencia_id": 2,
+    })
+    despues = client.get("/api/personal?residencia=2&limit=1000").get_json()
+    assert len(despues["personal"]) == len(antes["personal"]) + 1
+    assert 11170001 in [p["dni"] for p in despues["personal"]]
@@ -0,0 +1,145 @@
+import json
+import socket
+import types
+
+import eventos
+from app import Paciente, bus_pacientes, db
+from eventos import BusPostgres
+
+
+def nuevo(residencia):
+    return {
+        "nombre": "Evento",
+        "apellido": "Prueba",
+        "edad": 70,
+        "habitacion": "auto",
+        "residencia_id": residencia,
+    }
+
+
+def test_eventos_paciente(login):
+    client = login
+    todas = bus_pacientes.suscribir()
+    solo_dos = bus_pacientes.suscribir(2)
+    try:
+        client.post("/api/pacientes/11150001/registrar", json=nuevo(1))
+        datos = dict(nuevo(2), dni=11150001)
+        client.post("/api/pacientes/11150001/editar", json=datos)
+        evento = todas.siguiente(timeout=1)
+        assert evento["tipo"] == "insert"
+        assert evento["dni"] == 11150001
+        evento = todas.siguiente(timeout=1)
+        assert evento["tipo"] == "update"
+        assert evento["residencia_id"] == 2
+        assert evento["residencia_anterior"] == 1
+        assert solo_dos.siguiente(timeout=1)["tipo"] == "update"
+        assert solo_dos.siguiente(timeout=0.01) is None
+    finally:
+        bus_pacientes.cancelar(todas)
+        bus_pacientes.cancelar(solo_dos)
+
+
+def test_evento_descartado_en_rollback(app):
+    suscripcion = bus_pacientes.suscribir()
+    try:
+        db.session.add(Paciente(dni=11150002, nombre="Evento",
+                                apellido="Rollback", edad=70, habitacion=1,
+                                residencia=1))
+        db.session.flush()
+        # El INSERT ya se ejecuto y su evento quedo esperando el commit
+        assert db.session.info["eventos_pacientes"]
+        db.session.rollback()
+        assert suscripcion.siguiente(timeout=0.01) is None
+        assert "eventos_pacientes" not in db.session.info
+    finally:
+        bus_pacientes.cancelar(suscripcion)
+        db.session.close()
+
+
+def test_stream_sse(login):
+    client = login
+    response = client.get("/api/pacientes/stream?residencia=1")
+    assert response.mimetype == "text/event-stream"
+    partes = response.response
+    assert next(partes) == b"retry: 3000\n\n"
+    client.post("/api/pacientes/11150003/registrar", json=nuevo(1))
+    mensaje = next(partes).decode()
+    assert mensaje.startswith("event: insert\n")
+    datos = json.loads(mensaje.split("data: ", 1)[1])
+    assert datos["dni"] == 11150003
+    response.close()
+
+
+def test_stream_sse_sin_hilos_libres(app, client):
+    app.config["SSE_MAX_SUSCRIPTORES"] = 1
+    ocupada = bus_pacientes.suscribir()
+    try:
+        response = client.get("/api/pacientes/stream")
+        assert response.data == b"retry: 15000\n\n"
+        assert response.headers["Retry-After"] == "15"
+    finally:
+        bus_pacientes.cancelar(ocupada)
+        app.config["SSE_MAX_SUSCRIPTORES"] = None
+
+
+class ConexionFalsa:
+    """Lo minimo de una conexion psycopg2 para escuchar: entrega las
+    notificaciones pendientes y despues se 'cae'."""
+
+    def __init__(self, eventos):
+        self.lectura, self.escritura = socket.socketpair()
+        self.escritura.send(b"x")
+        self.pendientes = [json.dumps(evento) for evento in eventos]
+        self.notifies = []
+
+    def fileno(self):
+        return self.lectura.fileno()
+
+    def set_session(self, autocommit):
+        pass
+
+    def cursor(self):
+        return self
+
+    def execute(self, sentencia):
+        pass
+
+    def poll(self):
+        if not self.pendientes:
+            raise OSError("conexion perdida")
+        self.notifies.append(
+            types.SimpleNamespace(payload=self.pendientes.pop(0)))
+
+    def close(self):
+        self.lectura.close()
+        self.escritura.close()
+
+
+def test_listen_reconecta(monkeypatch):
+    monkeypatch.setattr(eventos, "ESPERA_MINIMA", 0.01)
+    intentos = []
+
+    def conectar():
+        intentos.append(1)
+        if len(intentos) == 1:
+            raise OSError("sin servidor")
+        if len(intentos) == 2:
+            return ConexionFalsa([{"tipo": "insert", "residencia_id": 1}])
+        return ConexionFalsa([])
+
+    bus = BusPostgres(conectar)
+    suscripcion = bus.suscribir(2)
+    otra = bus.suscribir(1)
+    assert otra.siguiente(timeout=5)["tipo"] == "insert"
+    # Tras reconectar todos recargan: pudieron perderse eventos
+    assert suscripcion.siguiente(timeout=5) == {"tipo": "recargar"}
+    hilo = bus.hilo
+    bus.cancelar(suscripcion)
+    bus.cancelar(otra)
+    hilo.join(timeout=5)
+    assert not hilo.is_alive()
+    assert bus.hilo is None
+    # Sin hilo, una nueva suscripcion vuelve a escuchar
+    nueva = bus.suscribir()
+    assert bus.hilo is not None
+    bus.cancelar(nueva)
@@ -0,0 +1,77 @@
+import csv
+import gzip
+import io
+
+import pytest
+
+from app import Paciente, PersonalMedico, db
+from exportar import exportar, hay_pyarrow
+
+
+def leer_csv(datos):
+    return list(csv.reader(io.StringIO(datos.decode("utf-8"))))
+
+
+def test_exportar_pacientes_csv(app, login, contar_consultas):
+    client = login
+    with contar_consultas() as consultas:
+        response = client.get("/api/export/pacientes")
+        filas = leer_csv(response.data)
+    assert response.mimetype == "text/csv"
+    assert filas[0] == ["dni", "nombre", "apellido", "edad", "habitacion",
+                        "residencia", "usuario"]
+    with app.app_context():
+        assert len(filas) - 1 == db.session.query(Paciente).count()
+        db.session.close()
+    assert len(consultas) <= 1
+
+
+def test_exportar_personal_gzip_por_residencia(app, login):
+    client = login
+    response = client.get("/api/export/personal?residencia=2&gzip=1")
+    assert response.mimetype == "application/gzip"
+    assert "personal.csv.gz" in response.headers["Content-Disposition"]
+    filas = leer_csv(gzip.decompress(response.data))
+    assert {fila[5] for fila in filas[1:]} == {"2"}
+    with app.app_context():
+        assert len(filas) - 1 == db.session.query(PersonalMedico).filter(
+            PersonalMedico.residencia == 2).count()
+        db.session.close()
+
+
+def test_exportar_requiere_admin(app, client):
+    assert client.get("/api/export/pacientes").status_code == 401
+    with app.app_context():
+        usuario = db.session.query(Paciente.usuario).filter(
+            Paciente.usuario.isnot(None)).first()[0]
+        db.session.close()
+    token = client.post("/api/login", json={
+        "user": usuario, "password": "1234", "token": True,
+    }).get_json()["token"]
+    response = client.get("/api/export/pacientes",
+                          headers={"Authorization": "Bearer " + token})
+    assert response.status_code == 403
+
+
+def test_exportar_por_lotes():
+    filas = [(i, "A", "B", 80, 1, 1, None) for i in range(25)]
+    partes = list(exportar("pacientes", filas, tamano=10))
+    assert len(partes) == 3
+    assert len(leer_csv(b"".join(partes))) == 26
+
+
+@pytest.mark.skipif(hay_pyarrow(), reason="pyarrow instalado")
+def test_exportar_parquet_sin_pyarrow(login):
+    client = login
+    response = client.get("/api/export/pacientes?formato=parquet")
+    assert response.status_code == 400
+
+
+@pytest.mark.skipif(not hay_pyarrow(), reason="requiere pyarrow")
+def test_exportar_parquet(login):
+    client = login
+    import pyarrow.parquet as pq
+
+    response = client.get("/api/export/pacientes?formato=parquet&residencia=1")
+    tabla = pq.read_table(io.BytesIO(response.data))
+    assert set(tabla.column("residencia").to_pylist()) == {1}
@@ -0,0 +1,58 @@
+import os
+import subprocess
+import sys
+
+from app import (
+    create_app,
+    db,
+    despues_de_fork,
+    directorio_personal,
+    estaticos,
+    indice_pacientes,
+    precalentar,
+)
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_importar_no_arma_la_app():
+    # Con una BD inalcanzable: importar y crear la app no debe conectarse
+    codigo = ("import app, sys; assert 'app' not in vars(app); "
+              "app.create_app(); "
+              "assert 'pyarrow' not in sys.modules")
+    subprocess.run(
+        [sys.executable, "-c", codigo], cwd=RAIZ, check=True, timeout=60,
+        env=dict(os.environ,
+                 DATABASE_URL="postgresql://nadie@127.0.0.1:9/nada"))
+
+
+def test_config_pisa_el_entorno():
+    app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite://",
+                      "API_TOKEN_MAX_AGE": 5})
+    assert app.config["API_TOKEN_MAX_AGE"] == 5
+    assert not app.config["SQLALCHEMY_ENGINE_OPTIONS"]
+    assert "login" in app.view_functions
+
+
+def test_precalentar_y_fork(tmp_path):
+    app = create_app({"SQLALCHEMY_DATABASE_URI":
+                      "sqlite:///%s" % (tmp_path / "fabrica.db")})
+    with app.app_context():
+        db.create_all()
+    indice_pacientes.invalidar()
+    directorio_personal.invalidar()
+    try:
+        precalentar(app)
+        assert indice_pacientes.construido
+        assert directorio_personal.grupos == {}
+        assert estaticos.archivos
+        assert app.jinja_env.cache
+        with app.app_context():
+            pool = db.engine.pool
+        despues_de_fork(app)
+        with app.app_context():
+            assert db.engine.pool is not pool
+            db.session.remove()
+    finally:
+        indice_pacientes.invalidar()
+        directorio_personal.invalidar()
@@ -0,0 +1,77 @@
+import json
+import re
+
+from app import Paciente, db, fragmentos_html
+from fragmentos import CacheFragmentos, tamano
+
+
+def test_version_distinta_se_vuelve_a_generar():
+    cache = CacheFragmentos()
+    assert cache.obtener(("fila", 1), (1, "a"), lambda: "A") == "A"
+    assert cache.obtener(("fila", 1), (1, "a"), lambda: "otro") == "A"
+    assert cache.obtener(("fila", 1), (1, "b"), lambda: "B") == "B"
+    assert (cache.aciertos, cache.fallos) == (1, 2)
+    cache.invalidar(("fila", 1))
+    assert cache.bytes == 0 and not cache.items
+
+
+def test_desaloja_por_memoria():
+    ocupa = tamano((("fila", 0), (0,), "x" * 100))
+    cache = CacheFragmentos(max_bytes=ocupa * 3)
+    for dni in range(5):
+        cache.obtener(("fila", dni), (dni,), lambda: "x" * 100)
+    # El acceso mueve la fila 2 al final del LRU
+    cache.obtener(("fila", 2), (2,), lambda: "nuevo")
+    cache.obtener(("fila", 5), (5,), lambda: "x" * 100)
+    assert list(cache.items) == [("fila", 4), ("fila", 2), ("fila", 5)]
+    assert cache.bytes <= cache.max_bytes
+    assert cache.desalojos == 3
+    cache.invalidar_tipo("fila")
+    assert cache.bytes == 0
+
+
+def filas_tabla(html):
+    return re.findall(rb"<tr>\s*<td>(\d+)</td>\s*<td>([^<]*)</td>", html)
+
+
+def test_ver_pacientes_desde_fragmentos(app, login, paciente):
+    fragmentos_html.limpiar()
+    url = "/pacientes?limit=20"
+    primera = login.get(url).data
+    assert len(filas_tabla(primera)) == 20
+    aciertos = fragmentos_html.aciertos
+    assert login.get(url, headers={"Cache-Control": "no-cache"}).data == primera
+    assert fragmentos_html.aciertos >= aciertos + 20
+    datos = re.search(rb"const pacientes = (\[.*\])\n", primera).group(1)
+    assert [p["dni"] for p in json.loads(datos)] == [
+        int(dni) for dni, nombre in filas_tabla(primera)]
+
+    # Una edicion invalida la fila y la pagina muestra el valor nuevo
+    original = db.session.get(Paciente, paciente.dni)
+    nombre = original.nombre
+    try:
+        original.nombre = "Fragmento"
+        db.session.commit()
+        assert ("fila", paciente.dni) not in fragmentos_html.items
+        filas = dict(filas_tabla(login.get(url).data))
+        assert filas[str(paciente.dni).encode()] == b"Fragmento"
+    finally:
+        original.nombre = nombre
+        db.session.commit()
+
+
+def test_paginas_por_rol(client, login):
+    fragmentos_html.limpiar()
+    anonimo = client.application.test_client()
+    inicio = anonimo.get("/login").data
+    assert anonimo.get("/login").data == inicio
+    assert ("pagina", "login.html", "anonimo") in fragmentos_html.items
+    home = login.get("/").data
+    assert b"Cerrar Session" in home
+    assert ("pagina", "home.html", "admin") in fragmentos_html.items
+    # Con un mensaje flash la pagina se renderiza entera
+    respuesta = anonimo.post("/login", data={"user": "nadie",
+                                             "password": "x"})
+    assert "Usuario no existe" in respuesta.get_data(as_text=True)
+    assert "Usuario no existe" not in anonimo.get("/login").get_data(
+        as_text=True)
@@ -0,0 +1,109 @@
+import pytest
+
+from app import limites_login
+from limites import CubosMemoria
+
+
+@pytest.fixture
+def limites(app):
+    anteriores = limites_login.usuario, limites_login.ip
+    limites_login.usuario = (3, 1 / 60)
+    limites_login.ip = (10, 1 / 60)
+    limites_login.limpiar()
+    yield limites_login
+    limites_login.usuario, limites_login.ip = anteriores
+    limites_login.limpiar()
+
+
+def test_cubo_se_vacia_y_se_recarga():
+    cubos = CubosMemoria()
+    assert [cubos.tomar("a", 2, 0.5, ahora=0) for _ in range(2)] == [0, 0]
+    assert cubos.tomar("a", 2, 0.5, ahora=0) == 2
+    # Un token cada 2 segundos, sin pasar de la capacidad
+    assert cubos.tomar("a", 2, 0.5, ahora=2) == 0
+    assert cubos.tomar("a", 2, 0.5, ahora=100) == 0
+    assert cubos.tomar("a", 2, 0.5, ahora=100) == 0
+    assert cubos.tomar("a", 2, 0.5, ahora=100) == 2
+    # Otras claves no se ven afectadas
+    assert cubos.tomar("b", 2, 0.5, ahora=100) == 0
+
+
+def test_cubos_acotados():
+    cubos = CubosMemoria(max_cubos=2)
+    for clave in "abc":
+        cubos.tomar(clave, 1, 1, ahora=0)
+    assert list(cubos.cubos) == ["b", "c"]
+
+
+def test_api_login_por_usuario(client, limites):
+    datos = {"user": "personal1", "password": "x"}
+    for _ in range(3):
+        response = client.post("/api/login", json=datos)
+        assert response.get_json()["message"] == "Contraseña incorrecta"
+    response = client.post("/api/login", json=datos)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) == 60
+    # La contraseña correcta tampoco pasa hasta que se recarga el cubo
+    datos["password"] = "1234"
+    assert client.post("/api/login", json=datos).status_code == 429
+    # Otro usuario desde la misma IP sigue pudiendo entrar
+    response = client.post("/api/login",
+                           json={"user": "personal0", "password": "1234"})
+    assert response.get_json()["message"] == "Correcto inicio de sesion"
+
+
+def test_login_por_ip(client, limites):
+    for i in range(10):
+        client.post("/login", data={"user": "personal%d" % i,
+                                    "password": "x"})
+    response = client.post("/login", data={"user": "personal9",
+                                            "password": "1234"})
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
+    assert b"Demasiados intentos" in response.data
+
+
+def test_recarga_permite_entrar(client, limites):
+    limites.usuario = (1, 1000.0)
+    datos = {"user": "personal1", "password": "1234"}
+    assert client.post("/api/login", json=datos).status_code == 200
+    # Con 1000 tokens por segundo el cubo ya se recargo
+    cubos = limites.cubos
+    cubos.cubos["usuario:personal1"] = (0.0, cubos.cubos[
+        "usuario:personal1"][1] - 1)
+    assert client.post("/api/login", json=datos).status_code == 200
+
+
+def test_usuario_desconocido_no_consulta_la_bd(client, limites,
+                                              contar_consultas):
+    datos = {"user": "nadie", "password": "1234"}
+    with contar_consultas() as consultas:
+        assert client.post("/api/login", json=datos).get_json()[
+            "message"] == "Usuario no existe"
+    assert len(consultas) == 1
+    with contar_consultas() as consultas:
+        assert client.post("/api/login", json=datos).get_json()[
+            "message"] == "Usuario no existe"
+    assert consultas == []
+
+
+def test_registro_olvida_desconocido(client, limites):
+    client.post("/api/login", json={"user": "nuevo_limites",
+                                    "password": "1234"})
+    assert limites.desconocido("nuevo_limites")
+    response = client.post("/api/usuarios/nuevo_limites/registrar", json={
+        "user": "nuevo_limites",
+        "password": "1234",
+        "es_admin": "1",
+        "dni": "11250001",
+        "nombre": "Nuevo",
+        "apellido": "Limites",
+        "titulo": "Doctor",
+        "especialidad": "Geriatria",
+        "residencia_id": 1,
+    })
+    assert response.get_json()["message"] == "Usuario creado correctamente"
+    assert not limites.desconocido("nuevo_limites")
+    response = client.post("/api/login", json={"user": "nuevo_limites",
+                                               "password": "1234"})
+    assert response.get_json()["message"] == "Correcto inicio de sesion"
@@ -0,0 +1,94 @@
+import pytest
+
+from app import Residencia, db, reconstruir_resumen
+
+
+@pytest.fixture
+def replica(app, tmp_path):
+    app.config["SQLALCHEMY_BINDS"] = {
+        "replica0": "sqlite:///%s" % (tmp_path / "replica.db")}
+    app.config["REPLICAS"] = ["replica0"]
+    engine = db.get_engine(app, bind="replica0")
+    db.Model.metadata.create_all(engine)
+    # La replica tiene residencias pero todavia no tiene pacientes
+    with engine.begin() as conexion:
+        conexion.execute(Residencia.__table__.insert(), [
+            {"id": 1, "nombre": "R1", "direccion": "D", "director": "X"}])
+    yield engine
+    db.escrituras.limpiar()
+    app.config["SQLALCHEMY_BINDS"] = {}
+    app.config["REPLICAS"] = []
+    engine.dispose()
+
+
+def entrar(app):
+    client = app.test_client()
+    client.post("/api/login", json={"user": "personal0", "password": "1234"})
+    return client
+
+
+def pacientes(client):
+    return client.get("/api/ver_pacientes?limit=5").get_json()["pacientes"]
+
+
+def test_lecturas_van_a_la_replica(app, replica):
+    assert pacientes(app.test_client()) == []
+
+
+def test_lee_tus_escrituras(app, replica):
+    client = entrar(app)
+    response = client.post("/api/pacientes/11180001/registrar", json={
+        "nombre": "Replica",
+        "apellido": "Prueba",
+        "edad": 80,
+        "habitacion": "auto",
+        "residencia_id": 1,
+    })
+    assert response.get_json()["error"] is False
+    # Quien acaba de escribir sigue leyendo de la principal
+    assert len(pacientes(client)) == 5
+    assert pacientes(app.test_client()) == []
+
+
+def test_ventana_de_escritura_vencida(app, replica):
+    app.config["REPLICA_VENTANA_ESCRITURA"] = 0
+    try:
+        client = entrar(app)
+        client.post("/api/pacientes/11180002/registrar", json={
+            "nombre": "Replica",
+            "apellido": "Vencida",
+            "edad": 80,
+            "habitacion": "auto",
+            "residencia_id": 1,
+        })
+        assert pacientes(client) == []
+    finally:
+        app.config["REPLICA_VENTANA_ESCRITURA"] = 5
+
+
+def test_lee_tus_escrituras_con_token(app, replica):
+    client = app.test_client()
+    token = client.post("/api/login", json={
+        "user": "personal0", "password": "1234", "token": True,
+    }).get_json()["token"]
+    # Sin cookies: cada request es un cliente nuevo con el mismo token
+    cabeceras = {"Authorization": "Bearer " + token}
+    app.test_client().post("/api/pacientes/11180003/registrar", json={
+        "nombre": "Replica",
+        "apellido": "Token",
+        "edad": 80,
+        "habitacion": "auto",
+        "residencia_id": 1,
+    }, headers=cabeceras)
+    datos = app.test_client().get("/api/ver_pacientes?limit=5",
+                                  headers=cabeceras).get_json()
+    assert len(datos["pacientes"]) == 5
+    assert pacientes(app.test_client()) == []
+
+
+def test_resumen_lee_version_de_la_principal(app, replica):
+    # La replica no tiene pacientes ni las versiones nuevas: el resumen
+    # igual tiene que coincidir con la principal
+    datos = app.test_client().get("/api/residencias/1/resumen").get_json()
+    assert datos == reconstruir_resumen(1).a_dict()
+    assert datos["pacientes"] > 0
@@ -0,0 +1,43 @@
+import json
+from decimal import Decimal
+
+import pytest
+
+from serializacion import SerializadorJSON, orjson
+
+COLUMNAS = ("dni", "nombre", "apellido", "edad", "habitacion", "residencia",
+            "usuario")
+FILAS = [
+    (30000000, "Ñandú", 'Comillas "y" \\', 80, 3, "R1", None),
+    (30000001, "Ana", "Perez", 91, 12, "R2", "familiar"),
+]
+
+serializadores = [pytest.param(False, id="stdlib")]
+if orjson is not None:
+    serializadores.append(pytest.param(True, id="orjson"))
+
+
+@pytest.mark.parametrize("usar_orjson", serializadores)
+def test_filas_igual_que_dicts(usar_orjson):
+    filas_json = SerializadorJSON(usar_orjson).filas(COLUMNAS)
+    esperado = [dict(zip(COLUMNAS, fila)) for fila in FILAS]
+    assert json.loads(filas_json.lista(FILAS)) == esperado
+    assert json.loads(b"[" + filas_json.lote(FILAS[:1]) + b"]") == esperado[:1]
+    assert filas_json.lista([]) == b"[]"
+
+
+@pytest.mark.parametrize("usar_orjson", serializadores)
+def test_dumps_compacto_y_ordenado(usar_orjson):
+    serializador = SerializadorJSON(usar_orjson)
+    assert serializador.dumps({"b": 1, "a": [True, None]}) == (
+        b'{"a":[true,null],"b":1}')
+    assert json.loads(serializador.dumps({"total": Decimal("1.5")})) == {
+        "total": "1.5"}
+    assert serializador.valor(None) == "null"
+
+
+def test_api_ver_pacientes_mismo_json(client):
+    data = client.get("/api/ver_pacientes?limit=3").get_json()
+    assert len(data["pacientes"]) == 3
+    assert set(data["pacientes"][0]) == set(COLUMNAS)
+    assert data["siguiente"] == data["pacientes"][-1]["dni"]